@@ -0,0 +1,14 @@
+"""Benchmarks of viewclust, run with asv.
+
+Every hot path is timed (time_*) and has its peak resident memory
+tracked (peakmem_*) over synthetic workloads of growing size, so a
+regression shows up on the commit introducing it:
+
+    $ asv run HEAD^!
+    $ asv continuous master HEAD
+
+The job counts default to 1000, 10000 and 100000. Larger workloads,
+up to tens of millions of jobs, are set with a comma separated list:
+
+    $ VIEWCLUST_BENCH_JOBS=1000000,10000000 asv run HEAD^!
+"""
@@ -0,0 +1,65 @@
+import pandas as pd
+from viewclust.slurm import sacct_chunks
+from viewclust.slurm.compact_jobs import compact_jobs
+from viewclust.slurm.sacct_jobs import _get_slurm_records, _slurm_raw_processing
+from .common import d_from, d_to, dump_path, job_counts, write_dumps
+
+
+class SacctParsing:
+    """Reading and processing raw sacct records, as done by sacct_jobs."""
+
+    params = job_counts()
+    param_names = ['n_jobs']
+    timeout = 1800
+
+    def setup_cache(self):
+        write_dumps()
+
+    def setup(self, n_jobs):
+        self.raw = _get_slurm_records(dump_path(n_jobs))
+
+    def time_read_dump(self, n_jobs):
+        _get_slurm_records(dump_path(n_jobs))
+
+    def peakmem_read_dump(self, n_jobs):
+        _get_slurm_records(dump_path(n_jobs))
+
+    def time_raw_processing(self, n_jobs):
+        _slurm_raw_processing(self.raw.copy(), False)
+
+    def peakmem_raw_processing(self, n_jobs):
+        _slurm_raw_processing(self.raw.copy(), False)
+
+    def time_sacct_chunks(self, n_jobs):
+        for _ in sacct_chunks(d_from, d_to=d_to, sacct_file=dump_path(n_jobs)):
+            pass
+
+    def peakmem_sacct_chunks(self, n_jobs):
+        for _ in sacct_chunks(d_from, d_to=d_to, sacct_file=dump_path(n_jobs)):
+            pass
+
+
+class CompactJobs:
+    """Compact dtypes of processed job records."""
+
+    params = job_counts()
+    param_names = ['n_jobs']
+    timeout = 1800
+
+    def setup_cache(self):
+        write_dumps()
+
+    def setup(self, n_jobs):
+        self.jobs = pd.concat(sacct_chunks(d_from, d_to=d_to,
+                                           sacct_file=dump_path(n_jobs)),
+                              ignore_index=True)
+
+    def time_compact_jobs(self, n_jobs):
+        compact_jobs(self.jobs)
+
+    def track_compact_ratio(self, n_jobs):
+        compact = compact_jobs(self.jobs)
+        return (compact.memory_usage(deep=True).sum()
+                / self.jobs.memory_usage(deep=True).sum())
+
+    track_compact_ratio.unit = 'ratio'
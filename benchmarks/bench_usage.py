@@ -0,0 +1,83 @@
+import pandas as pd
+import viewclust
+from .common import (d_from, d_to, job_counts, jobs_path, synthetic_node_states,
+                     target, write_jobs)
+
+
+class JobUse:
+    """job_use for every use unit and time reference."""
+
+    params = (job_counts(),
+              ['cpu', 'gpu', 'billing', 'cpu-eqv', 'gpu-eqv', 'gpu-eqv-cdr'],
+              ['', 'sub', 'req', 'sub+req', 'horizon+req', 'eligible'])
+    param_names = ['n_jobs', 'use_unit', 'time_ref']
+    timeout = 1800
+
+    def setup_cache(self):
+        write_jobs()
+
+    def setup(self, n_jobs, use_unit, time_ref):
+        self.jobs = pd.read_pickle(jobs_path(n_jobs))
+
+    def time_job_use(self, n_jobs, use_unit, time_ref):
+        viewclust.job_use(self.jobs, d_from, target, d_to=d_to,
+                          use_unit=use_unit, time_ref=time_ref)
+
+    def peakmem_job_use(self, n_jobs, use_unit, time_ref):
+        viewclust.job_use(self.jobs, d_from, target, d_to=d_to,
+                          use_unit=use_unit, time_ref=time_ref)
+
+
+class UsersRun:
+    """Running usage split by user."""
+
+    params = job_counts()
+    param_names = ['n_jobs']
+    timeout = 1800
+
+    def setup_cache(self):
+        write_jobs()
+
+    def setup(self, n_jobs):
+        self.jobs = pd.read_pickle(jobs_path(n_jobs))
+
+    def time_get_users_run(self, n_jobs):
+        viewclust.get_users_run(self.jobs, d_from, target, d_to=d_to)
+
+    def peakmem_get_users_run(self, n_jobs):
+        viewclust.get_users_run(self.jobs, d_from, target, d_to=d_to)
+
+
+class TargetSeries:
+    """Hourly target series of a year split into periods."""
+
+    params = [1, 12, 365]
+    param_names = ['n_periods']
+
+    def setup(self, n_periods):
+        bounds = pd.date_range('2020-01-01', '2021-01-01', periods=n_periods + 1)
+        self.frames = [(f'{start:%Y-%m-%dT%H:%M:%S}', f'{end:%Y-%m-%dT%H:%M:%S}',
+                             100 + i)
+                            for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))]
+
+    def time_target_series(self, n_periods):
+        viewclust.target_series(self.frames)
+
+    def peakmem_target_series(self, n_periods):
+        viewclust.target_series(self.frames)
+
+
+class NodeUse:
+    """node_use over a month of five minute polls."""
+
+    params = [100, 1000]
+    param_names = ['n_nodes']
+
+    def setup(self, n_nodes):
+        self.node_states = synthetic_node_states(n_nodes, 31 * 24 * 12)
+
+    def time_node_use(self, n_nodes):
+        viewclust.node_use(self.node_states)
+
+    def peakmem_node_use(self, n_nodes):
+        viewclust.node_use(self.node_states)
@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pandas as pd
+from viewclust.slurm import sacct_chunks
+from viewclust.slurm.synthetic import write_sacct_dump
+
+d_from = '2020-01-01T00:00:00'
+d_to = '2020-02-01T00:00:00'
+target = 500
+
+
+def job_counts():
+    """Workload sizes, from VIEWCLUST_BENCH_JOBS if set."""
+
+    counts = os.environ.get('VIEWCLUST_BENCH_JOBS', '1000,10000,100000')
+    return [int(count) for count in counts.split(',')]
+
+
+def dump_path(n_jobs):
+    return f'sacct_{n_jobs}.txt'
+
+
+def jobs_path(n_jobs):
+    return f'jobs_{n_jobs}.pkl'
+
+
+def write_dumps():
+    """Write a seeded sacct dump of every size to the working directory."""
+
+    for n_jobs in job_counts():
+        write_sacct_dump(dump_path(n_jobs), n_jobs, d_from=d_from, d_to=d_to,
+                         seed=0)
+
+
+def write_jobs():
+    """Write the processed sacct_jobs frame of every size."""
+
+    write_dumps()
+    for n_jobs in job_counts():
+        jobs = pd.concat(sacct_chunks(d_from, d_to=d_to,
+                                      sacct_file=dump_path(n_jobs)),
+                         ignore_index=True)
+        jobs.to_pickle(jobs_path(n_jobs))
+
+
+def synthetic_node_states(n_nodes, periods, freq='5min', seed=0):
+    """Polled node states of n_nodes nodes, as read by node_use."""
+
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(d_from, periods=periods, freq=freq)
+    n = n_nodes * periods
+    t_cpu = np.tile(rng.choice([32, 48, 64], size=n_nodes), periods)
+    t_mem = np.tile(rng.choice([128000, 192000, 768000], size=n_nodes), periods)
+    return pd.DataFrame({
+        'a_cpu': (rng.random(n) * t_cpu).astype(np.int64),
+        't_cpu': t_cpu,
+        'a_mem': (rng.random(n) * t_mem).astype(np.int64),
+        't_mem': t_mem,
+    }, index=pd.Index(np.repeat(times, n_nodes), name='time'))
@@ -40,6 +40,7 @@ setup(
     ],
     description="Python package for visualizing cluster measures.",
     install_requires=requirements,
+    extras_require={'arrow': ['pyarrow']},
     license="MIT license",
     long_description=readme + '\n\n' + history,
     include_package_data=True,
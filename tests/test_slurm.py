@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+"""Tests for `viewclust.slurm` package."""
+
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import pandas as pd
+
+import viewclust
+from viewclust import slurm
+from viewclust.serialize import deserialize
+from viewclust.slurm.mem_efficiency import mem_fields, mem_plot_arrays
+from viewclust.slurm.sacct_jobs import sacct_fields
+
+try:
+    import pyarrow  # noqa: F401
+    _has_pyarrow = True
+except ImportError:
+    _has_pyarrow = False
+
+
+def _sacct_record(**fields):
+    """One raw sacct record as printed with --parsable2 --delimiter=';'."""
+    record = dict.fromkeys(sacct_fields, '')
+    record.update({
+        'Account': 'def-a_cpu', 'AllocCPUS': '4', 'AllocNodes': '1',
+        'AllocTRES': 'billing=4,cpu=4,mem=16G,node=1', 'NCPUS': '4',
+        'NNodes': '1', 'Partition': 'cpularge', 'QOS': 'normal',
+        'ReqCPUS': '4', 'ReqMem': '16G', 'ReqNodes': '1',
+        'ReqTRES': 'billing=4,cpu=4,mem=16G,node=1', 'State': 'COMPLETED',
+        'Timelimit': '01:00:00', 'TimelimitRaw': '60', 'User': 'alice',
+        'Elapsed': '00:30:00', 'ElapsedRaw': '1800',
+        'Eligible': '2020-01-01T00:00:00', 'Submit': '2020-01-01T00:00:00',
+        'Start': '2020-01-01T00:10:00', 'End': '2020-01-01T00:40:00',
+    })
+    record.update(fields)
+    return ';'.join(record[field] for field in sacct_fields)
+
+
+def _sacct_dump(records):
+    return '\n'.join([';'.join(sacct_fields)] + records) + '\n'
+
+
+class FakeSacct:
+    """Puts a fake sacct executable printing a given dump on PATH."""
+
+    def __init__(self):
+        self.dir = tempfile.mkdtemp()
+        self.dump = os.path.join(self.dir, 'dump.txt')
+        self.log = os.path.join(self.dir, 'calls.txt')
+        self.failure = os.path.join(self.dir, 'fail')
+        script = os.path.join(self.dir, 'sacct')
+        with open(script, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    f'echo "$@" >> {self.log}\n'
+                    f'if rm {self.failure} 2>/dev/null; then\n'
+                    '  echo "sacct: error: Problem talking to the database" >&2\n'
+                    '  exit 1\n'
+                    'fi\n'
+                    f'cat {self.dump}\n')
+        os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+        self.set_records([])
+        self._path = os.environ['PATH']
+        os.environ['PATH'] = self.dir + os.pathsep + self._path
+
+    def set_records(self, records):
+        with open(self.dump, 'w') as f:
+            f.write(_sacct_dump(records))
+
+    def fail_next(self):
+        """Make the next call fail."""
+        open(self.failure, 'w').close()
+
+    def calls(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return f.read().splitlines()
+
+    def close(self):
+        os.environ['PATH'] = self._path
+        shutil.rmtree(self.dir)
+
+
+class TestSlurm(unittest.TestCase):
+    """Tests for `viewclust.slurm` package."""
+
+    def setUp(self):
+        self.sacct = FakeSacct()
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.sacct.close()
+        shutil.rmtree(self.tmp)
+
+    def test_sacct_jobs(self):
+        self.sacct.set_records([_sacct_record(JobID='1'),
+                                _sacct_record(JobID='2', User='bob')])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        self.assertEqual(list(jobs['user']), ['alice', 'bob'])
+        self.assertEqual(jobs['mem'].iloc[0], 16 * 1024)
+
+        self.sacct.fail_next()
+        with self.assertRaisesRegex(RuntimeError, 'talking to the database'):
+            slurm.sacct_jobs('', '2020-01-01T00:00:00')
+
+    def test_parsed_tres(self):
+        self.sacct.set_records([
+            _sacct_record(JobID='1'),
+            _sacct_record(JobID='2', ReqTRES='billing=9,cpu=2,gres/gpu:v100=1,'
+                                             'gres/gpu=1,mem=1.5G,node=1',
+                          AllocTRES='billing=9,cpu=2,gres/gpu=1,mem=1.5G,node=1')])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        self.assertEqual(list(jobs['reqtres_billing']), [4, 9])
+        self.assertEqual(list(jobs['reqtres_gres/gpu:v100']), [0, 1])
+        self.assertEqual(list(jobs['mem']), [16384, 1536])
+        self.assertEqual(list(jobs['ngpus']), [0, 1])
+
+        units = ['gpu', 'gpu-eqv', 'billing']
+        parsed = viewclust.job_use(jobs, '2020-01-01T00:00:00', 1,
+                                   use_unit=units)
+        raw = jobs.drop(columns=[c for c in jobs.columns if '_' in c])
+        unparsed = viewclust.job_use(raw, '2020-01-01T00:00:00', 1,
+                                     use_unit=units)
+        for expected, result in zip(unparsed[1:], parsed[1:]):
+            pd.testing.assert_frame_equal(result, expected)
+
+    def test_sacct_chunks(self):
+        records = [_sacct_record(JobID=str(i)) for i in range(5)]
+        self.sacct.set_records(records)
+        chunks = list(slurm.sacct_chunks('2020-01-01T00:00:00', chunksize=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(str(chunks[0]['submit'].dtype), 'datetime64[ns]')
+
+        self.sacct.fail_next()
+        with self.assertRaisesRegex(RuntimeError, 'exit status 1'):
+            list(slurm.sacct_chunks('2020-01-01T00:00:00', chunksize=2))
+
+        chunks = list(slurm.sacct_chunks('', sacct_file=self.sacct.dump,
+                                         chunksize=10))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(chunks[0]['jobid']), [str(i) for i in range(5)])
+
+    def test_synthetic_sacct_records(self):
+        records = slurm.synthetic_sacct_records(2000, seed=3, chunksize=700)
+        self.assertEqual(list(records.columns), sacct_fields)
+        self.assertEqual(len(records), 2000)
+        self.assertEqual(records['JobIDRaw'].nunique(), 2000)
+        pd.testing.assert_frame_equal(
+            records, slurm.synthetic_sacct_records(2000, seed=3, chunksize=700))
+        self.assertFalse(records.equals(slurm.synthetic_sacct_records(2000, seed=4)))
+
+        states = records['State'].str.split().str[0]
+        for state in ['COMPLETED', 'PENDING', 'RUNNING', 'TIMEOUT', 'CANCELLED']:
+            self.assertIn(state, set(states))
+        self.assertTrue(records['JobID'].str.contains('_').any())
+        self.assertTrue(records['ReqTRES'].str.contains('gres/gpu').any())
+
+        # The dump holds the same records and is read like sacct output
+        slurm.write_sacct_dump(self.sacct.dump, 2000, seed=3, chunksize=700)
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        self.assertEqual(list(jobs['jobid']), list(records['JobID']))
+        self.assertTrue(jobs.loc[states.to_numpy() == 'PENDING', 'start'].isna().all())
+        self.assertTrue((jobs['reqcpus'] > 0).all())
+
+    def test_sacct_times(self):
+        self.sacct.set_records([
+            _sacct_record(JobID='1', Timelimit='1-02:00:00'),
+            _sacct_record(JobID='2', Timelimit='UNLIMITED', Start='Unknown',
+                          End='Unknown', State='PENDING'),
+            _sacct_record(JobID='3', Timelimit='Partition_Limit', End='None')])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        self.assertEqual(jobs['timelimit'].iloc[0], pd.Timedelta('26H'))
+        self.assertTrue(jobs['timelimit'].iloc[1:].isna().all())
+        self.assertTrue(pd.isna(jobs['start'].iloc[1]))
+        self.assertEqual(jobs['start'].iloc[2], pd.Timestamp('2020-01-01T00:10:00'))
+
+        durations = slurm.parse_sacct_durations(
+            pd.Series(['2-00:00:00', '12:30:00', '05:30', '00:00:01.500', None]))
+        self.assertEqual(list(durations[:4]), [pd.Timedelta('2D'),
+                                               pd.Timedelta('12.5H'),
+                                               pd.Timedelta('330s'),
+                                               pd.Timedelta('1.5s')])
+        self.assertTrue(pd.isna(durations[4]))
+
+    def test_compact_jobs(self):
+        self.sacct.set_records([
+            _sacct_record(JobID=str(i), User=['alice', 'bob'][i % 2],
+                          ReqCPUS=str(1 + i % 8), Submit='2020-01-01T00:%02d:00' % i)
+            for i in range(40)])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        compact = slurm.sacct_jobs('', '2020-01-01T00:00:00', compact=True)
+
+        self.assertEqual(str(compact['user'].dtype), 'category')
+        self.assertEqual(compact['reqcpus'].dtype, 'int8')
+        self.assertEqual(compact['mem'].dtype, 'int16')
+        self.assertNotIn('alloctres', compact.columns)
+        self.assertNotIn('reqtres', compact.columns)
+        self.assertIn('reqtres_billing', compact.columns)
+
+        report = slurm.memory_report(jobs, compact)
+        self.assertLess(report.loc['total', 'ratio'], 0.5)
+        self.assertEqual(report.loc['alloctres', 'after'], 0)
+
+        units = ['cpu', 'billing', 'cpu-eqv']
+        expected = viewclust.job_use(jobs, '2020-01-01T00:00:00', 4, use_unit=units)
+        result = viewclust.job_use(compact, '2020-01-01T00:00:00', 4, use_unit=units)
+        for frame, compact_frame in zip(expected[1:], result[1:]):
+            pd.testing.assert_frame_equal(compact_frame, frame)
+        _, _, by_user, _ = viewclust.group_use(compact, '2020-01-01T00:00:00', 4, 'user')
+        self.assertEqual(list(by_user.columns), ['alice', 'bob'])
+
+    def test_sharded_sacct_records(self):
+        self.assertEqual(slurm.sacct_shards.shard_bounds(
+            '2020-01-01', '2020-01-03T12:00:00', '1D'),
+            [('2020-01-01T00:00:00', '2020-01-02T00:00:00'),
+             ('2020-01-02T00:00:00', '2020-01-03T00:00:00'),
+             ('2020-01-03T00:00:00', '2020-01-03T12:00:00')])
+
+        self.sacct.set_records([_sacct_record(JobID=str(i), Cluster='cedar')
+                                for i in range(3)])
+        self.sacct.fail_next()
+        records = slurm.sharded_sacct_records(
+            '2020-01-01', '2020-01-04', shard='1D', clusters=['cedar', 'graham'],
+            max_concurrency=2, backoff=0)
+        # Every shard returns the same jobs, which are merged per cluster
+        self.assertEqual(list(records['JobID']), ['0', '1', '2'])
+        calls = self.sacct.calls()
+        self.assertEqual(len(calls), 7)
+        self.assertGreaterEqual(sum('-M graham' in call for call in calls), 3)
+
+        self.sacct.fail_next()
+        with self.assertRaises(RuntimeError):
+            slurm.sharded_sacct_records('2020-01-01', '2020-01-02', shard='1D',
+                                        retries=0)
+
+        jobs = slurm.sacct_jobs('', '2020-01-01', shard='1000D')
+        self.assertEqual(list(jobs['jobid']), ['0', '1', '2'])
+
+        # Clusters without shards, one query per cluster
+        calls = len(self.sacct.calls())
+        jobs = slurm.sacct_jobs('', '2020-01-01', clusters=['cedar', 'graham'])
+        self.assertEqual(list(jobs['jobid']), ['0', '1', '2'])
+        calls = self.sacct.calls()[calls:]
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(any('-M graham' in call for call in calls))
+        with self.assertRaises(ValueError):
+            slurm.sacct_jobs('', '2020-01-01', clusters=['cedar'],
+                             job_store=os.path.join(self.tmp, 'jobs.db'))
+
+    def test_mem_efficiency(self):
+        rows = [
+            # JobID;User;Account;Submit;Start;State;NCPUS;NNodes;ReqMem;MaxRSS
+            '1;alice;def-a;2020-01-01T00:00:00;2020-01-01T01:00:00;COMPLETED;4;1;1000Mc;',
+            '1.batch;;def-a;2020-01-01T01:00:00;2020-01-01T01:00:00;COMPLETED;4;1;1000Mc;2000M',
+            '1.extern;;def-a;2020-01-01T01:00:00;2020-01-01T01:00:00;COMPLETED;4;1;1000Mc;1024K',
+            '2;bob;def-a;2020-01-01T00:00:00;2020-01-01T02:00:00;COMPLETED;8;2;8Gn;',
+            '2.batch;;def-a;2020-01-01T02:00:00;2020-01-01T02:00:00;COMPLETED;8;2;8Gn;4G',
+            '3;bob;def-b;2020-01-01T00:00:00;Unknown;PENDING;1;1;4G;',
+        ]
+        dump = os.path.join(self.tmp, 'mem.txt')
+        with open(dump, 'w') as f:
+            f.write('\n'.join([';'.join(mem_fields)] + rows) + '\n')
+
+        records = slurm.sacct_mem_records('', sacct_file=dump)
+        jobs, users, accounts = slurm.mem_efficiency(records)
+        self.assertEqual(list(jobs.index), ['1', '2'])
+        self.assertEqual(list(jobs['req_mem']), [4000, 16384])
+        self.assertEqual(list(jobs['max_rss']), [2000, 4096])
+        self.assertEqual(list(jobs['efficiency']), [0.5, 0.25])
+        self.assertEqual(list(users['jobs']), [1, 1])
+        self.assertAlmostEqual(accounts.loc['def-a', 'efficiency'], 6096 / 20384)
+
+        x, y = mem_plot_arrays(jobs)
+        self.assertEqual(len(x), 6)
+        self.assertIsNone(x[2])
+        self.assertEqual(y[1], 2.0)
+
+        # Allocations from sacct_jobs with steps queried separately
+        self.sacct.set_records([_sacct_record(JobID='1', NCPUS='4', ReqMem='1000Mc')])
+        allocations = slurm.sacct_jobs('', '2020-01-01T00:00:00')
+        jobs, _, _ = slurm.mem_efficiency(allocations, records)
+        self.assertEqual(jobs.loc['1', 'efficiency'], 0.5)
+        compact = slurm.sacct_jobs('', '2020-01-01T00:00:00', compact=True)
+        jobs, _, _ = slurm.mem_efficiency(compact, records)
+        self.assertEqual(jobs.loc['1', 'efficiency'], 0.5)
+        with self.assertWarns(UserWarning):
+            jobs, _, _ = slurm.mem_efficiency(allocations)
+        self.assertTrue(jobs.empty)
+
+        self.sacct.fail_next()
+        with self.assertRaises(RuntimeError):
+            slurm.sacct_mem_records('2020-01-01T00:00:00')
+
+    @unittest.skipUnless(_has_pyarrow, 'requires pyarrow')
+    def test_serialize_frame(self):
+        self.sacct.set_records([
+            _sacct_record(JobID='1'),
+            _sacct_record(JobID='2', Submit='2020-02-01T00:00:00',
+                          Start='2020-02-01T00:00:00',
+                          End='2020-02-01T01:00:00')])
+        for name in ['jobs.parquet', 'jobs.feather', 'jobs.pkl']:
+            path = os.path.join(self.tmp, name)
+            jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00',
+                                    serialize_frame=path)
+            loaded = deserialize(path)
+            pd.testing.assert_frame_equal(loaded, jobs)
+
+            columns = ['submit', 'start', 'end', 'reqcpus', 'mem']
+            loaded = deserialize(path, columns=columns,
+                                 time_range=('2020-01-15', None),
+                                 time_column='submit')
+            self.assertEqual(list(loaded.columns), columns)
+            self.assertEqual(len(loaded), 1)
+            self.assertEqual(str(loaded['reqcpus'].dtype), 'Int64')
+
+    def test_job_store(self):
+        store = slurm.JobStore(os.path.join(self.tmp, 'jobs.sqlite'))
+        pending = _sacct_record(JobID='2', State='PENDING', Start='Unknown',
+                                End='Unknown')
+        self.sacct.set_records([_sacct_record(JobID='1'), pending])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00', job_store=store)
+        self.assertEqual(len(jobs), 2)
+        self.assertIn('--start 2020-01-01T00:00', self.sacct.calls()[0])
+
+        # Second pull only asks for records since the high-water mark
+        started = _sacct_record(JobID='2', State='RUNNING',
+                                Start='2020-01-02T00:00:00', End='Unknown')
+        self.sacct.set_records([started])
+        jobs = slurm.sacct_jobs('', '2020-01-01T00:00:00', job_store=store)
+        mark = store.high_water_mark - store.overlap
+        self.assertIn(f'--start {mark:%Y-%m-%dT%H:%M}', self.sacct.calls()[1])
+        self.assertEqual(len(store), 2)
+        self.assertEqual(jobs.set_index('jobid').loc['2', 'state'], 'RUNNING')
+        store.close()
+
+        # A failed pull keeps the marks, and the retry asks for the same period
+        store = slurm.JobStore(os.path.join(self.tmp, 'retry.sqlite'))
+        self.sacct.fail_next()
+        with self.assertRaises(RuntimeError):
+            store.refresh('2020-01-01T00:00:00')
+        self.assertIsNone(store.high_water_mark)
+        self.assertIsNone(store.covered_from)
+        self.assertEqual(store.refresh('2020-01-01T00:00:00'), 1)
+        self.assertIn('--start 2020-01-01T00:00', self.sacct.calls()[-1])
+        self.assertIsNotNone(store.high_water_mark)
+        store.close()
@@ -3,9 +3,72 @@
 """Tests for `viewclust` package."""
 
 
+import contextlib
+import io
+import json
+import os
+import tempfile
 import unittest
 
+import numpy as np
+import pandas as pd
+
 import viewclust
+from viewclust.billing import (billing_profiles, equivalent_use,
+                               load_profiles, parse_billing_weights,
+                               register_profile)
+from viewclust.downsample import downsample
+from viewclust.profiling import JsonTraceSink, profile, stage
+from viewclust.serialize import deserialize
+from viewclust.to_terminal import bin_series
+from viewclust.tres import parse_tres
+
+try:
+    import pyarrow  # noqa: F401
+    _has_pyarrow = True
+except ImportError:
+    _has_pyarrow = False
+
+
+def _random_jobs(n=200, seed=0):
+    """Small frame of job records in the format produced by sacct_jobs."""
+    rng = np.random.default_rng(seed)
+    submit = pd.Timestamp('2020-01-01') + pd.to_timedelta(
+        rng.integers(0, 5 * 86400, n), unit='s')
+    wait = pd.to_timedelta(rng.integers(0, 20000, n), unit='s')
+    run = pd.to_timedelta(rng.integers(1, 50000, n), unit='s')
+    jobs = pd.DataFrame({
+        'jobid': [str(i) for i in range(n)],
+        'user': rng.choice(['alice', 'bob', 'bob.x', 'carol'], n),
+        'account': rng.choice(['def-a_cpu', 'def-b_gpu'], n),
+        'partition': rng.choice(['cpu', 'gpu'], n),
+        'submit': submit,
+        'eligible': submit,
+        'start': submit + wait,
+        'end': submit + wait + run,
+        'timelimit': run * 2,
+        'state': 'COMPLETED',
+        'reqcpus': rng.integers(1, 32, n),
+        'mem': rng.integers(1000, 100000, n),
+        'reqtres': ['cpu=1,mem=4G,node=1,billing=%d,gres/gpu=%d' % (b, g)
+                    for b, g in zip(rng.integers(1, 64, n),
+                                    rng.integers(0, 4, n))],
+    })
+    # A few pending and running jobs
+    jobs.loc[:4, ['start', 'end']] = pd.NaT
+    jobs.loc[:4, 'state'] = 'PENDING'
+    jobs.loc[5:9, 'end'] = pd.NaT
+    jobs.loc[5:9, 'state'] = 'RUNNING'
+    return jobs
+
+
+def _concat_target_series(time_frames):
+    """target_series as it was built before TargetSteps."""
+    periods = [pd.Series(pd.to_numeric(period[2]), dtype='float64',
+                         index=pd.date_range(period[0], period[1], freq='H'))
+               for period in time_frames]
+    series = pd.concat(periods)
+    return series.groupby(series.index).first().rename_axis(None)
 
 
 class TestViewclust(unittest.TestCase):
@@ -13,6 +76,8 @@ class TestViewclust(unittest.TestCase):
 
     def setUp(self):
         self.series_output = 2185
+        self.jobs = _random_jobs()
+        self.d_from = '2020-01-02T00:00:00'
 
     def test_target_series(self):
         # Q4:
@@ -23,3 +88,433 @@ class TestViewclust(unittest.TestCase):
         time_frames = [(d_from, d_dec, 100), (d_dec, d_to, 500)]
         series = viewclust.target_series(time_frames)
         assert self.series_output == series.size
+
+    def test_target_steps(self):
+        # Overlapping periods: the first period wins
+        time_frames = [('2019-10-01T00:00:00', '2019-10-03T00:00:00', 100),
+                       ('2019-10-02T12:00:00', '2019-10-05T00:00:00', 500),
+                       ('2019-10-04T00:00:00', '2019-10-04T12:00:00', 7)]
+        series = viewclust.target_series(time_frames)
+        self.assertEqual(str(series.dtype), 'float64')
+        self.assertEqual(series['2019-10-03T00:00:00'], 100)
+        self.assertEqual(series['2019-10-04T06:00:00'], 500)
+
+        steps = viewclust.TargetSteps(time_frames)
+        times = pd.date_range('2019-09-30', '2019-10-06', freq='7min')
+        expected = np.cumsum(series).reindex(
+            series.index.union(times)).ffill().fillna(0)[times]
+        np.testing.assert_allclose(steps.cumulative(times), expected)
+        np.testing.assert_allclose(steps(series.index), series)
+        self.assertEqual(steps.integrate(['2019-10-01T02:30:00'])[0], 250)
+
+    def test_target_steps_unaligned(self):
+        # Points are only dropped on an exact timestamp of an earlier period
+        time_frames = [('2020-01-02T00:00:00', '2020-01-03T06:00:00', 50),
+                       ('2020-01-03T07:30:00', '2020-01-03T07:30:00', 8),
+                       ('2020-01-02T10:30:00', '2020-01-02T20:15:00', 3),
+                       ('2020-01-02T05:00:00', '2020-01-04T05:00:00', 9),
+                       ('2020-01-02T12:30:00', '2020-01-03T01:30:00', 4)]
+        expected = _concat_target_series(time_frames)
+        steps = viewclust.TargetSteps(time_frames)
+        pd.testing.assert_series_equal(steps.series(), expected,
+                                       check_freq=False)
+        np.testing.assert_allclose(steps(expected.index), expected)
+        np.testing.assert_allclose(steps.cumulative(expected.index),
+                                   np.cumsum(expected))
+
+    def test_job_use_engines(self):
+        for kwargs in [{}, {'use_unit': 'cpu-eqv', 'time_ref': 'sub'},
+                       {'d_to': '2020-01-04T00:00:00'},
+                       {'grouper_interval': 'min', 'usage_interval': 'D'},
+                       {'job_state': 'queued'}, {'time_ref': 'horizon+req'},
+                       {'job_state': 'queued', 'd_to': '2020-01-04T00:00:00',
+                        'usage_interval': '30min'}]:
+            grouper = viewclust.job_use(self.jobs, self.d_from, 50,
+                                        engine='grouper', **kwargs)
+            sweep = viewclust.job_use(self.jobs, self.d_from, 50, **kwargs)
+            for expected, result in zip(grouper, sweep):
+                pd.testing.assert_series_equal(result, expected,
+                                               check_names=False,
+                                               check_freq=False)
+
+    def test_get_users_run(self):
+        d_to = '2020-01-05T00:00:00'
+        users_run = viewclust.get_users_run(self.jobs, self.d_from, 50,
+                                            d_to=d_to)
+        self.assertEqual(list(users_run.columns),
+                         list(self.jobs['user'].unique()))
+        for user in users_run.columns:
+            user_jobs = self.jobs[self.jobs['user'] == user]
+            _, _, running, _ = viewclust.job_use(user_jobs, self.d_from, 50,
+                                                 d_to=d_to, engine='grouper')
+            np.testing.assert_allclose(users_run[user],
+                                       running[self.d_from:d_to])
+
+    def test_group_use(self):
+        d_to = '2020-01-05T00:00:00'
+        _, queued, running, dist = viewclust.group_use(
+            self.jobs, self.d_from, 50, ['account', 'partition'], d_to=d_to)
+        self.assertEqual(running.columns.names, ['account', 'partition'])
+        for (account, partition) in running.columns:
+            mask = ((self.jobs['account'] == account)
+                    & (self.jobs['partition'] == partition))
+            _, g_queued, g_running, g_dist = viewclust.job_use(
+                self.jobs[mask], self.d_from, 50, d_to=d_to)
+            key = (account, partition)
+            np.testing.assert_allclose(queued[key][self.d_from:d_to],
+                                       g_queued[self.d_from:d_to])
+            np.testing.assert_allclose(running[key][self.d_from:d_to],
+                                       g_running[self.d_from:d_to])
+            np.testing.assert_allclose(dist[key], g_dist)
+
+        _, _, long_running, _ = viewclust.group_use(
+            self.jobs, self.d_from, 50, 'account', d_to=d_to, long_form=True)
+        self.assertEqual(long_running.index.names, ['account', 'datetime'])
+
+        _, _, by_unit, _ = viewclust.group_use(
+            self.jobs, self.d_from, 50, 'account', d_to=d_to,
+            use_unit=['cpu', 'gpu'])
+        _, _, gpu, _ = viewclust.group_use(
+            self.jobs, self.d_from, 50, 'account', d_to=d_to, use_unit='gpu')
+        self.assertEqual(by_unit.columns.names, ['account', 'use_unit'])
+        for account in gpu.columns:
+            np.testing.assert_allclose(by_unit[(account, 'gpu')], gpu[account])
+
+    def test_fleet_use(self):
+        d_to = '2020-01-05T00:00:00'
+        targets = {'def-a_cpu': 20}
+        fleet = viewclust.fleet_use(self.jobs, self.d_from, targets, d_to=d_to)
+        self.assertEqual(fleet.index.names, ['account', 'datetime'])
+        for account in ['def-a_cpu', 'def-b_gpu']:
+            _, queued, running, dist = viewclust.job_use(
+                self.jobs[self.jobs['account'] == account], self.d_from,
+                targets.get(account, 0), d_to=d_to)
+            report = fleet.loc[account]
+            np.testing.assert_allclose(report['queued'][queued.index], queued)
+            np.testing.assert_allclose(report['running'][running.index],
+                                       running)
+            np.testing.assert_allclose(
+                fleet.loc[account, 'dist_from_target'].dropna(), dist)
+
+        pooled = viewclust.fleet_use(self.jobs, self.d_from, targets,
+                                     d_to=d_to, workers=2)
+        pd.testing.assert_frame_equal(pooled, fleet)
+
+    def test_usage_tracker(self):
+        now = pd.Timestamp('2020-01-06T12:00:00')
+        cut = pd.Timestamp('2020-01-04T00:00:00')
+        jobs = self.jobs[self.jobs['submit'] <= now].copy()
+        for column in ['start', 'end']:
+            jobs.loc[jobs[column] > now, column] = pd.NaT
+
+        # Records as they were at cut, then the records changed since
+        earlier = jobs[jobs['submit'] <= cut].copy()
+        for column in ['start', 'end']:
+            earlier.loc[earlier[column] > cut, column] = pd.NaT
+        changed = jobs[(jobs[['submit', 'start', 'end']] > cut).any(axis=1)]
+
+        tracker = viewclust.UsageTracker(window='2D')
+        tracker.update(earlier, now=cut)
+        tracker.update(changed, now=now)
+        fresh = viewclust.UsageTracker(window='2D')
+        fresh.update(jobs, now=now)
+        for live, full in zip(tracker.usage(), fresh.usage()):
+            self.assertEqual(live.index[0], pd.Timestamp('2020-01-04T12:00:00'))
+            self.assertEqual(live.index[-1], pd.Timestamp('2020-01-06T11:00:00'))
+            np.testing.assert_allclose(live, full, atol=1e-9)
+
+        # Running usage matches job_use away from the ends of the records
+        _, _, running, _ = viewclust.job_use(jobs, self.d_from, 50, d_to=str(now))
+        live = tracker.usage()[1]['2020-01-05':'2020-01-06T10:00:00']
+        np.testing.assert_allclose(live, running[live.index])
+
+        tracker.remove(changed['jobid'])
+        tracker.update(changed)
+        np.testing.assert_allclose(tracker.usage()[1], fresh.usage()[1],
+                                   atol=1e-9)
+
+        # Jobs that finished before the window are not tracked again
+        tracker.update(jobs)
+        ended = jobs['end'] < pd.Timestamp('2020-01-04T12:00:00')
+        self.assertEqual(len(tracker), (~ended).sum())
+        for live, full in zip(tracker.usage(), fresh.usage()):
+            np.testing.assert_allclose(live, full, atol=1e-9)
+
+        # A quiet poll returns a frame without columns
+        tracker.update(pd.DataFrame())
+        self.assertEqual(tracker.now, now.value)
+        tracker.update(pd.DataFrame(), now=now + pd.Timedelta('1H'))
+        self.assertEqual(tracker.usage()[0].index[-1],
+                         pd.Timestamp('2020-01-06T12:00:00'))
+
+    def test_node_use(self):
+        index = pd.date_range('2020-01-01', periods=8, freq='30min')
+        node_states = pd.DataFrame({'a_cpu': [8, 16, 0, 32, 4, 4, 48, 12],
+                                    't_cpu': [32, 32, 48, 48, 32, 32, 48, 48],
+                                    'a_mem': [1, 2, 3, 4, 5, 6, 7, 8],
+                                    't_mem': [8, 8, 8, 8, 16, 16, 16, 16]},
+                                   index=index)
+        original = node_states.copy()
+        cores_total, cores_perc, mem_perc, max_perc = viewclust.node_use(
+            node_states, freq='2H')
+        pd.testing.assert_frame_equal(node_states, original)
+
+        first = node_states.iloc[:4]
+        self.assertEqual(list(cores_total), [160, 160])
+        self.assertAlmostEqual(cores_perc.iloc[0], first['a_cpu'].sum() / 160)
+        self.assertAlmostEqual(
+            mem_perc.iloc[0],
+            (first['a_mem'] / first['t_mem'] * first['t_cpu']).sum() / 160)
+        p_max = np.maximum(first['a_cpu'] / first['t_cpu'],
+                           first['a_mem'] / first['t_mem'])
+        self.assertAlmostEqual(max_perc.iloc[0],
+                               (p_max * first['t_cpu']).sum() / 160)
+
+    def test_node_state_store(self):
+        rng = np.random.default_rng(0)
+        times = pd.date_range('2020-01-01', periods=180, freq='min')
+        nodes = ['cdr%d' % i for i in range(20)]
+        n = len(times) * len(nodes)
+        node_states = pd.DataFrame({
+            'node': np.tile(nodes, len(times)),
+            'partition': np.tile(['cpu'] * 15 + ['gpu'] * 5, len(times)),
+            'a_cpu': rng.integers(0, 32, n),
+            't_cpu': np.full(n, 32),
+            'a_mem': rng.random(n) * 1e5,
+            't_mem': np.full(n, 1.9e5)}, index=np.repeat(times, len(nodes)))
+
+        store = viewclust.NodeStateStore(node_states.iloc[:n // 3])
+        store.append(node_states.iloc[n // 3:])
+        self.assertEqual(len(store), n)
+        self.assertEqual(str(store.frame['node'].dtype), 'category')
+        self.assertEqual(store.frame['a_cpu'].dtype, np.int32)
+        self.assertEqual(store.frame['a_mem'].dtype, np.float32)
+        self.assertLess(store.memory_usage(),
+                        node_states.memory_usage(deep=True).sum() / 4)
+
+        for stored, polled in zip(store.aggregate(),
+                                  viewclust.node_use(node_states)):
+            np.testing.assert_allclose(stored, polled, rtol=1e-6)
+        by_partition = store.aggregate('partition', freq='30min')
+        self.assertEqual(list(by_partition[1].columns), ['cpu', 'gpu'])
+        gpu = node_states[node_states['partition'] == 'gpu']
+        for stored, polled in zip(by_partition,
+                                  viewclust.node_use(gpu, freq='30min')):
+            np.testing.assert_allclose(stored['gpu'], polled, rtol=1e-6)
+
+    def test_stream_node_use(self):
+        rng = np.random.default_rng(1)
+        times = pd.date_range('2020-01-01', periods=150, freq='min', name='time')
+        n = len(times) * 10
+        node_states = pd.DataFrame({
+            'partition': np.tile(['cpu'] * 6 + ['gpu'] * 4, len(times)),
+            'a_cpu': rng.integers(0, 32, n),
+            't_cpu': np.full(n, 32),
+            'a_mem': rng.random(n) * 1e5,
+            't_mem': np.full(n, 1.9e5)}, index=np.repeat(times, 10))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, 'polls.csv.1'),
+                     os.path.join(tmp, 'polls.csv')]
+            node_states.iloc[:n // 2].to_csv(paths[0])
+            node_states.iloc[n // 2:].to_csv(paths[1])
+            streamed = viewclust.stream_node_use(paths, chunksize=333)
+            by_partition = viewclust.stream_node_use(paths, 'partition',
+                                                     chunksize=333)
+            with self.assertRaises(ValueError):
+                viewclust.stream_node_use(paths, time_column='polled')
+
+        for stream, polled in zip(streamed, viewclust.node_use(node_states)):
+            np.testing.assert_allclose(stream, polled)
+        gpu = node_states[node_states['partition'] == 'gpu']
+        for stream, polled in zip(by_partition, viewclust.node_use(gpu)):
+            np.testing.assert_allclose(stream['gpu'], polled)
+
+    def test_downsample(self):
+        rng = np.random.default_rng(0)
+        index = pd.date_range('2020-01-01', periods=20000, freq='min')
+        series = pd.Series(rng.random(len(index)), index=index)
+        series.iloc[12345] = 50
+        series.iloc[6789] = -5
+        for method in ['lttb', 'minmax']:
+            reduced = downsample(series, 500, method)
+            self.assertLessEqual(len(reduced), 500)
+            self.assertEqual(reduced.index[0], index[0])
+            self.assertEqual(reduced.index[-1], index[-1])
+            self.assertEqual(reduced.max(), 50)
+            self.assertEqual(reduced.min(), -5)
+        self.assertIs(downsample(series, 0), series)
+
+        user_run = pd.DataFrame(rng.random((len(index), 5)), index=index,
+                                columns=['a', 'b', 'c', 'd', 'e'])
+        fig = viewclust.insta_plot(series, series, series, user_run=user_run,
+                                   max_points=500, max_users=2,
+                                   gl_threshold=100)
+        names = [trace.name for trace in fig.data]
+        self.assertIn('other', names)
+        self.assertEqual(len(names), 1 + 3 + 2)
+        self.assertTrue(all(len(trace.x) <= 500 for trace in fig.data))
+        self.assertEqual(fig.data[-1].type, 'scattergl')
+
+    def test_terminal_plot(self):
+        index = pd.date_range('2020-01-01', periods=1000, freq='min')
+        series = pd.Series(np.arange(1000, dtype='float64'), index=index)
+        binned = bin_series(series, 10)
+        self.assertEqual(len(binned), 10)
+        self.assertEqual(binned['min'].iloc[0], 0)
+        self.assertEqual(binned['max'].iloc[-1], 999)
+        self.assertAlmostEqual(binned['mean'].mean(), series.mean(), delta=1)
+
+        calls = []
+
+        def source():
+            calls.append(len(calls))
+            return [series.iloc[:500 * len(calls)], series / 2]
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            viewclust.watch_terminal(source, interval=0, frames=2,
+                                     labels=['queued', 'running'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(out.getvalue().count('\x1b[2J'), 2)
+        self.assertIn('queued', out.getvalue())
+
+        # Redraws from a tracker survive polls without any records
+        tracker = viewclust.UsageTracker(window='2D')
+        tracker.update(self.jobs)
+        polls = iter(['2020-01-08T00:00:00', '2020-01-08T00:10:00'])
+
+        def refresh():
+            tracker.update(pd.DataFrame(), now=next(polls))
+            return list(tracker.usage())
+
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            viewclust.watch_terminal(refresh, interval=0, frames=2)
+        self.assertEqual(out.getvalue().count('\x1b[2J'), 2)
+
+    def test_profiling(self):
+        self.assertIsNone(stage('idle').rows_out)
+        records = []
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.json')
+            with profile(records.append, JsonTraceSink(path), memory=True):
+                viewclust.job_use(self.jobs, self.d_from, 50,
+                                  d_to='2020-01-10T00:00:00')
+            with open(path) as f:
+                trace = json.load(f)
+
+        stages = {record['stage']: record for record in records}
+        self.assertEqual(stages['job_use']['rows_in'], len(self.jobs))
+        self.assertEqual(stages['job_use.prepare']['parent'], 'job_use')
+        self.assertEqual(stages['job_use.sweep']['depth'], 1)
+        self.assertGreaterEqual(stages['job_use']['peak_bytes'],
+                                stages['job_use.sweep']['peak_bytes'])
+        self.assertEqual([event['name'] for event in trace],
+                         [record['stage'] for record in records])
+
+        # Sinks are removed on exit, and debugging prints every stage
+        records.clear()
+        index = pd.date_range('2020-01-01', periods=4, freq='30min')
+        node_states = pd.DataFrame({'a_cpu': 1, 't_cpu': 2, 'a_mem': 1,
+                                    't_mem': 2}, index=index)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            viewclust.node_use(node_states, debugging=True)
+        self.assertEqual(records, [])
+        self.assertIn('node_use.grouper', out.getvalue())
+
+    def test_serialize_series(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'running.parquet')
+            _, _, running, _ = viewclust.job_use(self.jobs, self.d_from, 50,
+                                                 serialize_running=path)
+            pd.testing.assert_series_equal(deserialize(path), running,
+                                           check_index_type=False,
+                                           check_freq=False)
+            window = ('2020-01-03T00:00:00', '2020-01-03T05:00:00')
+            loaded = deserialize(path, time_range=window)
+            self.assertEqual(len(loaded), 6)
+
+    def test_use_cache(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = viewclust.UseCache(maxsize=2, directory=tmp)
+            first = cache.job_use(self.jobs, self.d_from, 50, use_unit='gpu')
+            second = cache.job_use(self.jobs, self.d_from, 50, use_unit='gpu')
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            for expected, result in zip(first, second):
+                pd.testing.assert_series_equal(result, expected)
+            # Explicit defaults share the key of the defaulted call
+            cache.job_use(self.jobs, self.d_from, 50, use_unit='gpu',
+                          job_state='all', engine='sweep')
+            self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+            cache.job_use(self.jobs, self.d_from, 50, use_unit='cpu')
+            cache.job_use(self.jobs, self.d_from, 50, use_unit='cpu-eqv')
+            self.assertEqual(cache.stats['entries'], 2)
+            self.assertEqual(cache.misses, 3)
+
+            # Evicted from memory but still on disk
+            cache.job_use(self.jobs, self.d_from, 50, use_unit='gpu')
+            self.assertEqual(cache.disk_hits, 1)
+
+            # Changing the frame changes the fingerprint
+            jobs = self.jobs.copy()
+            jobs.loc[20, 'reqcpus'] += 1
+            cache.job_use(jobs, self.d_from, 50, use_unit='gpu')
+            self.assertEqual(cache.misses, 4)
+
+        # Re-registering a profile changes the key of its use unit
+        cache = viewclust.UseCache()
+        try:
+            register_profile('test-eqv', 'CPU=1.0')
+            first = cache.job_use(self.jobs, self.d_from, 50, use_unit='test-eqv')
+            register_profile('test-eqv', 'CPU=2.0')
+            second = cache.job_use(self.jobs, self.d_from, 50, use_unit='test-eqv')
+        finally:
+            billing_profiles.pop('test-eqv', None)
+        self.assertEqual(cache.misses, 2)
+        np.testing.assert_allclose(second[2], 2 * first[2])
+
+    def test_job_use_units(self):
+        units = ['cpu', 'cpu-eqv', 'gpu', 'gpu-eqv', 'gpu-eqv-cdr', 'billing']
+        _, queued, running, dist = viewclust.job_use(self.jobs, self.d_from,
+                                                     50, use_unit=units)
+        self.assertEqual(list(running.columns), units)
+        for unit in units:
+            _, u_queued, u_running, u_dist = viewclust.job_use(
+                self.jobs, self.d_from, 50, use_unit=unit)
+            np.testing.assert_allclose(queued[unit], u_queued)
+            np.testing.assert_allclose(running[unit], u_running)
+            np.testing.assert_allclose(dist[unit], u_dist)
+
+        # Without a billing TRES, billing usage is zero
+        jobs = self.jobs.assign(reqtres='cpu=1,mem=4G,node=1')
+        with self.assertWarns(UserWarning):
+            _, _, running, _ = viewclust.job_use(jobs, self.d_from, 50,
+                                                 use_unit='billing')
+        self.assertEqual(running.abs().sum(), 0)
+
+    def test_billing_profiles(self):
+        weights = parse_billing_weights('CPU=0.5,Mem=0.25G,GRES/gpu:v100=2')
+        self.assertEqual(weights, {'cpu': 0.5, 'mem': 0.25 / 1024,
+                                   'gres/gpu:v100': 2.0})
+
+        tres = parse_tres(pd.Series(['cpu=4,mem=2G,gres/gpu:v100=1,gres/gpu=1',
+                                     'cpu=8,mem=512M', None]))
+        self.assertEqual(tres.loc[0, 'mem'], 2048)
+        self.assertEqual(tres.loc[2].sum(), 0)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'profiles.json')
+            with open(path, 'w') as f:
+                json.dump({'v100-eqv': 'CPU=0.5,Mem=0.25G,GRES/gpu:v100=2',
+                           'sum-eqv': {'weights': 'CPU=1,Mem=1G',
+                                       'mode': 'sum'}}, f)
+            load_profiles(path)
+        use = equivalent_use(tres, ['v100-eqv', 'sum-eqv'])
+        np.testing.assert_allclose(use['v100-eqv'], [2, 4, 0])
+        np.testing.assert_allclose(use['sum-eqv'], [6, 8.5, 0])
+
+        _, _, running, _ = viewclust.job_use(self.jobs, self.d_from, 50,
+                                             use_unit=['sum-eqv'])
+        self.assertEqual(list(running.columns), ['sum-eqv'])
+        for name in ['v100-eqv', 'sum-eqv']:
+            billing_profiles.pop(name)
@@ -4,8 +4,13 @@ from ._version import __version__
 # High level functions
 from .job_use import job_use
 from .node_use import node_use
+from .node_states import NodeStateStore, stream_node_use
 from .cumu_plot import cumu_plot
 from .insta_plot import insta_plot
-from .target_series import target_series
+from .target_series import target_series, TargetSteps
 from .get_users_run import get_users_run
-from .to_terminal import to_terminal
+from .group_use import group_use
+from .fleet_use import fleet_use
+from .use_cache import UseCache
+from .usage_tracker import UsageTracker
+from .to_terminal import to_terminal, watch_terminal
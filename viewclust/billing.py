@@ -0,0 +1,124 @@
+import json
+import numpy as np
+import pandas as pd
+
+# Registered TRES billing weight profiles, by use_unit name
+billing_profiles = {}
+
+# Size suffixes of memory weights relative to megabytes
+_mem_scale = {'K': 1024, 'M': 1, 'G': 1 / 1024, 'T': 1 / 1024 ** 2}
+
+
+def parse_billing_weights(weights):
+    """Parse a slurm TRESBillingWeights string into weights per TRES.
+
+    Parameters
+    -------
+    weights: str
+        e.g. 'CPU=0.0625,Mem=0.015625G,GRES/gpu=1.0'.
+        Memory weights are per MB unless given a size suffix.
+
+    Returns
+    -------
+    dict
+        Lower cased TRES name to weight per unit of tres_matrix,
+        e.g. {'cpu': 0.0625, 'mem': 1.52587890625e-05, 'gres/gpu': 1.0}.
+    """
+
+    parsed = {}
+    for item in weights.split(','):
+        if item.strip() == '':
+            continue
+        name, value = item.split('=', 1)
+        name = name.strip().lower()
+        value = value.strip()
+        scale = 1
+        if value[-1:].upper() in _mem_scale:
+            scale = _mem_scale[value[-1].upper()]
+            value = value[:-1]
+        parsed[name] = float(value) * scale
+    return parsed
+
+
+def register_profile(name, weights, mode='max'):
+    """Register a billing weight profile usable as a job_use use_unit.
+
+    Parameters
+    -------
+    name: str
+        use_unit the profile is available as, e.g. 'gpu-eqv-nar'.
+    weights: str or dict
+        TRESBillingWeights string, or weights per TRES as returned by
+        parse_billing_weights.
+    mode: str, optional
+        How weighted TRES are combined: {'max', 'sum'}. 'max' matches
+        slurm's PriorityFlags=MAX_TRES. Defaults to 'max'.
+    """
+
+    if isinstance(weights, str):
+        weights = parse_billing_weights(weights)
+    if mode not in ('max', 'sum'):
+        raise AttributeError('invalid billing profile mode')
+    billing_profiles[name] = {'weights': dict(weights), 'mode': mode}
+
+
+def load_profiles(path):
+    """Register every profile in a JSON config file.
+
+    The file maps profile names to either a TRESBillingWeights string or
+    an object with 'weights' and optionally 'mode', e.g.
+    {"gpu-eqv-nar": "CPU=0.0625,Mem=0.015625G,GRES/gpu=1.0",
+     "sum-eqv": {"weights": "CPU=1.0,Mem=0.25G", "mode": "sum"}}
+    """
+
+    with open(path) as f:
+        config = json.load(f)
+    for name, profile in config.items():
+        if isinstance(profile, str):
+            register_profile(name, profile)
+        else:
+            register_profile(name, profile['weights'], profile.get('mode', 'max'))
+
+
+def equivalent_use(tres, profiles):
+    """Equivalent usage of every job under one or more billing profiles.
+
+    Parameters
+    -------
+    tres: DataFrame
+        Pre-parsed TRES, see viewclust.tres.tres_matrix.
+    profiles: str or list of str
+        Names of registered profiles.
+
+    Returns
+    -------
+    DataFrame
+        Aligned with tres, one column per profile.
+    """
+
+    if isinstance(profiles, str):
+        profiles = [profiles]
+
+    values = tres.to_numpy(dtype='float64')
+    columns = {name: i for i, name in enumerate(tres.columns)}
+    use = pd.DataFrame(index=tres.index)
+    for name in profiles:
+        profile = billing_profiles[name]
+        weights = np.zeros(len(columns))
+        for tres_name, weight in profile['weights'].items():
+            if tres_name in columns:
+                weights[columns[tres_name]] = weight
+        weighted = values * weights
+        if profile['mode'] == 'max':
+            use[name] = weighted.max(axis=1, initial=0)
+        else:
+            use[name] = weighted.sum(axis=1)
+    return use
+
+
+# Compute Canada clusters
+register_profile('cpu-eqv', 'CPU=1.0,Mem=0.25G')
+# Beluga and Graham
+register_profile('gpu-eqv', 'CPU=0.0625,Mem=0.015625G,GRES/gpu=1.0')
+# Cedar
+register_profile('gpu-eqv-cdr', 'CPU=0.1667,Mem=0.03125G,GRES/gpu=1.0')
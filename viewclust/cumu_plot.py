@@ -1,11 +1,13 @@
 import numpy as np
 import plotly.graph_objects as go
 import sys
+from viewclust.downsample import downsample, bucket_means, top_users, scatter
 
 
 def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
               fig_out='', query_bounds=True, submit_run=[], user_run=[],
-              plot_queued=False):
+              plot_queued=False, max_points=0, downsample_method='lttb',
+              gl_threshold=0, max_users=0):
     """Cumulative usage plot.
 
     This function is deprecated as of v0.3.0.
@@ -37,6 +39,17 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
         the queued series. Defaults to not plotting.
     plot_queued: bool, optional
         Draw the light blue line indicating the cumulative queued resources.
+    max_points: int, optional
+        Caps the points of every trace. 0 plots every point. Defaults to 0.
+    downsample_method: str, optional
+        How line traces are capped: {'lttb', 'minmax'}.
+        See viewclust.downsample. Defaults to 'lttb'.
+    gl_threshold: int, optional
+        Traces with more points are drawn with WebGL, e.g. 10000 for
+        multi-year minutely series. 0 never uses WebGL. Defaults to 0.
+    max_users: int, optional
+        Only stacks the users with the most usage and sums the others into
+        an 'other' band. 0 stacks every user. Defaults to 0.
 
     See Also
     -------
@@ -56,19 +69,24 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
         run_sum = run_sum.resample(resample_str).sum()
         queue_sum = queue_sum.resample(resample_str).sum()
 
+    def points(series):
+        series = downsample(series, max_points, downsample_method)
+        return series.index, series
+
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=clust_info.index,
-                             y=clust_sum,
+    fig.add_trace(scatter(*points(clust_sum), gl_threshold,
                              fill='tozeroy',
                              mode='none',
                              name='group allocation',
                              fillcolor='rgba(180, 180, 180, .3)'))
 
     if len(user_run) > 0:
-        for user in user_run:
+        user_sum = np.cumsum(top_users(user_run, max_users)).divide(len(clust_info))
+        user_sum = bucket_means(user_sum, max_points)
+        for user in user_sum:
             fig.add_trace(go.Scatter(
-                x=user_run.index,
-                y=np.cumsum(user_run[user]).divide(len(clust_info)),
+                x=user_sum.index,
+                y=user_sum[user],
                 hoverinfo='x+y',
                 opacity=.1,
                 mode='none',
@@ -77,20 +95,17 @@ def cumu_plot(clust_info, cores_queued, cores_running, resample_str='',
                 ))
 
     if plot_queued:
-        fig.add_trace(go.Scatter(x=cores_queued.index,
-                                 y=queue_sum,
+        fig.add_trace(scatter(*points(queue_sum), gl_threshold,
                                  mode='lines',
                                  name='Resources queued',
                                  marker_color='rgba(160,160,220, .8)'))
     if len(submit_run) > 0:
-        fig.add_trace(go.Scatter(x=submit_run.index,
-                                 y=np.cumsum(submit_run).divide(
-                                     len(clust_info)),
+        submit_sum = np.cumsum(submit_run).divide(len(clust_info))
+        fig.add_trace(scatter(*points(submit_sum), gl_threshold,
                                  mode='lines',
                                  name='Resources run at submit',
                                  marker_color='rgba(220,160,160, .8)'))
-    fig.add_trace(go.Scatter(x=cores_running.index,
-                             y=run_sum,
+    fig.add_trace(scatter(*points(run_sum), gl_threshold,
                              mode='lines',
                              name='Resources consumed',
                              marker_color='rgba(80,80,220, .8)'))
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def lttb(x, y, n_out):
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept, and from every bucket in
+    between the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+
+    Parameters
+    -------
+    x, y: array_like
+        Coordinates of the points, with x increasing.
+    n_out: int
+        Number of points to keep.
+
+    Returns
+    -------
+    ndarray of int
+    """
+
+    x = np.asarray(x, dtype='float64')
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Mean of every bucket, and of the last point after the last bucket
+    sizes = np.diff(edges)
+    mean_x = np.r_[np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes, x[-1]]
+    mean_y = np.r_[np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes, y[-1]]
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def minmax(y, n_out):
+    """Indices of the minimum and maximum of equal buckets.
+
+    Keeps every peak and trough, which LTTB can smooth over, along with
+    the first and last points. At most n_out indices are returned.
+    """
+
+    y = np.nan_to_num(np.asarray(y, dtype='float64'))
+    n = len(y)
+    n_buckets = (n_out - 2) // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    starts = np.linspace(0, n, n_buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(n_buckets), np.diff(np.r_[starts, n]))
+    lowest = np.lexsort((y, bucket))[starts]
+    highest = np.lexsort((-y, bucket))[starts]
+    return np.unique(np.r_[0, lowest, highest, n - 1])
+
+
+def downsample(series, max_points, method='lttb'):
+    """Series reduced to at most max_points points.
+
+    Parameters
+    -------
+    series: Series
+        Series with a sorted numeric or datetime index.
+    max_points: int
+        Cap on the number of points. 0 keeps every point.
+    method: str, optional
+        {'lttb', 'minmax'}. Defaults to 'lttb'.
+    """
+
+    if max_points == 0 or len(series) <= max_points:
+        return series
+    if method == 'lttb':
+        x = series.index.asi8 if isinstance(series.index, pd.DatetimeIndex) else series.index
+        kept = lttb(x, series.to_numpy(), max_points)
+    elif method == 'minmax':
+        kept = minmax(series.to_numpy(), max_points)
+    else:
+        raise AttributeError('invalid downsampling method')
+    return series.iloc[kept]
+
+
+def bucket_means(frame, max_points):
+    """Frame averaged over at most max_points equal buckets of rows.
+
+    Every column shares the same x, as needed for stacked traces. Buckets
+    are labeled by their first row.
+    """
+
+    n = len(frame)
+    if max_points == 0 or n <= max_points:
+        return frame
+    starts = np.linspace(0, n, max_points + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(max_points), np.diff(np.r_[starts, n]))
+    means = frame.groupby(bucket).mean()
+    means.index = frame.index[starts]
+    return means
+
+
+def top_users(user_run, max_users, other='other'):
+    """Keep the max_users largest columns and sum the rest into other."""
+
+    if max_users == 0 or user_run.shape[1] <= max_users:
+        return user_run
+    totals = user_run.sum()
+    keep = totals.nlargest(max_users).index
+    kept = user_run[[user for user in user_run.columns if user in keep]].copy()
+    kept[other] = user_run.drop(columns=keep).sum(axis=1)
+    return kept
+
+
+def scatter(x, y, gl_threshold=0, **kwargs):
+    """go.Scatter, or go.Scattergl once there are more than gl_threshold
+    points. Stacked and filled traces always use go.Scatter, which
+    Scattergl cannot draw."""
+
+    use_gl = (gl_threshold > 0 and len(x) > gl_threshold
+              and 'stackgroup' not in kwargs and 'fill' not in kwargs)
+    return (go.Scattergl if use_gl else go.Scatter)(x=x, y=y, **kwargs)
@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from viewclust.group_use import _group_codes
+from viewclust.job_use import _prepare_jobs, _dist_from_target, _with_period
+from viewclust.sweep import sweep_use
+
+# Job arrays attached from shared memory in every pool worker
+_shared = {}
+
+_columns = ['queued', 'running', 'dist_from_target', 'target']
+
+
+def fleet_use(jobs, d_from, targets, by='account', d_to='', use_unit='cpu',
+              job_state='all', time_ref='', grouper_interval='S',
+              usage_interval='H', workers=1):
+    """Takes a DataFrame of job records for many accounts and returns
+    job_use results for every account as a single keyed frame.
+
+    Every account is calculated exactly as job_use would on its own jobs.
+    Accounts are spread across a pool of processes that read the job
+    events from shared memory instead of receiving pickled frames.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs with
+        allusers=True.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    targets: int-like or dict
+        Target shared by every account, or a dict of targets by account.
+        Accounts missing from the dict have a target of 0.
+        Targets can be ints or target series, see job_use.
+    by: str or list of str, optional
+        Columns that key the results. Defaults to 'account'.
+    d_to: date str, optional
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+        Defaults to the latest time in the job records if empty.
+    use_unit, job_state, time_ref, grouper_interval, usage_interval: optional
+        See job_use.
+    workers: int, optional
+        Number of worker processes. 1 calculates every account in this
+        process. Defaults to 1.
+
+    Returns
+    -------
+    fleet: DataFrame
+        Indexed by the by columns and datetime, sorted by account, with
+        columns queued, running, dist_from_target and target.
+        Queued and running are 0 at bins only the other one covers.
+        dist_from_target is NaN outside of the query period.
+    """
+
+    if d_to == '':
+        t_max = jobs[['submit', 'start', 'end', 'eligible']].max(axis=1)
+        d_to = str(t_max.max())
+
+    codes, groups = _group_codes(jobs, by)
+    names = list(groups.names) + ['datetime']
+    if len(groups) == 0:
+        index = pd.MultiIndex.from_arrays([[]] * len(names), names=names)
+        return pd.DataFrame(columns=_columns, index=index, dtype='float64')
+
+    jobs = jobs.assign(group_code=codes)
+    jobs, weights = _prepare_jobs(jobs, d_to, [use_unit], job_state, time_ref)
+
+    # Shards are contiguous runs of the jobs of one account. Jobs without
+    # an account have code -1 and sort before every shard.
+    order = np.argsort(jobs['group_code'].to_numpy(), kind='stable')
+    bounds = np.searchsorted(jobs['group_code'].to_numpy()[order],
+                             np.arange(len(groups) + 1))
+    times = np.vstack([pd.DatetimeIndex(jobs[column]).asi8[order]
+                       for column in ('submit', 'start', 'end')])
+    weights = weights[use_unit].to_numpy(dtype='float64')[order]
+
+    shards = [(bounds[i], bounds[i + 1], _shard_target(targets, key),
+               d_from, d_to, grouper_interval, usage_interval)
+              for i, key in enumerate(groups)]
+
+    if workers == 1:
+        frames = [_shard_use(times, weights, shard) for shard in shards]
+    else:
+        frames = _pooled(times, weights, shards, workers)
+
+    return pd.concat(frames, keys=list(groups), names=names)
+
+
+def _shard_target(targets, key):
+    if isinstance(targets, dict):
+        return targets.get(key, 0)
+    return targets
+
+
+def _shard_use(times, weights, shard):
+    """job_use of the jobs between two bounds of the sorted job arrays."""
+
+    lo, hi, target, d_from, d_to, grouper_interval, usage_interval = shard
+    stamps = times[:, lo:hi].view('M8[ns]')
+    jobs = pd.DataFrame({'submit': stamps[0], 'start': stamps[1],
+                         'end': stamps[2]})
+    bins, queued, running = sweep_use(jobs, weights[lo:hi],
+                                      grouper_interval, usage_interval)
+
+    queued = _with_period(pd.Series(queued[0], index=bins).dropna(), d_from, d_to)
+    running = _with_period(pd.Series(running[0], index=bins).dropna(), d_from, d_to)
+    clust, dist_from_target = _dist_from_target(running, target, d_from, d_to)
+
+    frame = pd.DataFrame({'queued': queued, 'running': running,
+                          'dist_from_target': dist_from_target,
+                          'target': clust.reindex(running.index)},
+                         columns=_columns)
+    frame[['queued', 'running']] = frame[['queued', 'running']].fillna(0)
+    frame.index.name = 'datetime'
+    return frame
+
+
+def _pooled(times, weights, shards, workers):
+    """Run _shard_use for every shard in a process pool, in order."""
+
+    from multiprocessing import shared_memory
+
+    blocks = []
+    try:
+        specs = []
+        for array in (times, weights):
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+            specs.append((block.name, array.shape, array.dtype.str))
+
+        chunksize = max(1, len(shards) // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                 initargs=(specs,)) as pool:
+            return list(pool.map(_pooled_shard_use, shards,
+                                 chunksize=chunksize))
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def _attach(specs):
+    from multiprocessing import shared_memory
+
+    arrays = []
+    for name, shape, dtype in specs:
+        block = shared_memory.SharedMemory(name=name)
+        arrays.append(np.ndarray(shape, dtype, buffer=block.buf))
+        _shared.setdefault('blocks', []).append(block)
+    _shared['arrays'] = arrays
+
+
+def _pooled_shard_use(shard):
+    times, weights = _shared['arrays']
+    return _shard_use(times, weights, shard)
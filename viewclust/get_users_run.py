@@ -1,5 +1,6 @@
-from viewclust.job_use import job_use
-import pandas as pd
+from viewclust.group_use import group_use
+from viewclust.profiling import stage
+from viewclust.serialize import serialize
 
 
 def get_users_run(jobs, d_from, target, d_to='', use_unit='cpu',
@@ -11,6 +12,9 @@ def get_users_run(jobs, d_from, target, d_to='', use_unit='cpu',
     This function operates as a stepping stone for plotting usage figures
     and returns various series and frames for several different uses.
 
+    Usage of every user is calculated in a single sweep over the job events.
+    Users are matched exactly by name. See group_use for other groupings.
+
     Parameters
     -------
     jobs: DataFrame
@@ -28,8 +32,9 @@ def get_users_run(jobs, d_from, target, d_to='', use_unit='cpu',
         End of the query period, e.g. '2020-01-01T00:00:00'.
         Defaults to now if empty.
     serialize_running: str, optional
-        Pickle given structure with argument as a name.
-        If left empty, pickle procedure is skipped.
+        Serialize given structure with argument as a name. The format is
+        inferred from the extension, see viewclust.serialize.
+        If left empty, serialization is skipped.
         Defaults to empty.
 
     Returns
@@ -39,35 +44,15 @@ def get_users_run(jobs, d_from, target, d_to='', use_unit='cpu',
         "users" in the jobs data frame.
     """
 
-    users = jobs.user.unique()
-
-    user_count = 0
-    for user in users:
-        user_mask = jobs['user'].str.match(user)
-        user_jobs = jobs[user_mask].copy()
-        _, user_queued, user_running, _ = job_use(user_jobs, d_from,
-                                                  target, d_to=d_to,
-                                                  use_unit=use_unit)
-        user_queued=user_queued[d_from:d_to]
-        user_running=user_running[d_from:d_to]
-
-        if user_count == 0:
-            user_running_cat = pd.Series(user_running,
-                                         index=user_running.index,
-                                         name=user)
-        else:
-            user_running_ser = pd.Series(user_running,
-                                         index=user_running.index,
-                                         name=user)
-            user_running_cat = pd.concat([user_running_cat, user_running_ser],
-                                         axis=1)
-
-        user_count = user_count + 1
-
-    if user_count == 1:
-        user_running_cat = user_running_cat.to_frame()
+    with stage('get_users_run', rows_in=len(jobs)) as timed:
+        _, _, user_running_cat, _ = group_use(jobs, d_from, target, 'user',
+                                              d_to=d_to, use_unit=use_unit,
+                                              sort=False)
+        user_running_cat = user_running_cat.loc[d_from:d_to]
+        user_running_cat.columns.name = None
+        timed.rows_out = len(user_running_cat)
 
     if serialize_running != '':
-        user_running_cat.to_pickle(serialize_running)
+        serialize(user_running_cat, serialize_running)
 
     return user_running_cat
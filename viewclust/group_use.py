@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from viewclust.job_use import _prepare_jobs, _dist_from_target, _period_index
+from viewclust.profiling import stage
+from viewclust.sweep import sweep_use
+
+
+def group_use(jobs, d_from, target, by, d_to='', use_unit='cpu',
+              job_state='all', time_ref='', grouper_interval='S',
+              usage_interval='H', long_form=False, sort=True):
+    """Takes a DataFrame full of job information and returns usage
+    for every group of jobs based on specified unit.
+
+    Equivalent to calling job_use once for each group, but every group is
+    calculated in a single sweep over the job events.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job DataFrame typically generated by slurm/sacct_jobs
+        or the ccmnt package.
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    target: int-like
+        Typically a cpu allocation or core eqv value for a particular acount.
+        Can also be a target series. Shared by all groups.
+    by: str or list of str
+        Columns to split usage by, e.g. 'account' or ['account', 'qos'].
+    d_to: date str, optional
+        End of the query period, e.g. '2020-01-01T00:00:00'.
+        Defaults to the latest time in the job records if empty.
+    use_unit: str or list of str, optional
+        See job_use. A list adds a last 'use_unit' level to the group
+        columns, all units calculated in the same sweep.
+    job_state, time_ref, grouper_interval, usage_interval: optional
+        See job_use.
+    long_form: bool, optional
+        Return series indexed by the group columns and datetime instead of
+        frames with one column per group. With a list of use units, frames
+        with one column per unit are returned. Defaults to False.
+    sort: bool, optional
+        Sort groups by their keys. If False, groups are ordered by first
+        appearance in jobs. Defaults to True.
+
+    Returns
+    -------
+    clust:
+        Frame of system info at given time intervals.
+    queued:
+        Frame of queued resources, one column per group.
+    running:
+        Frame of running resources, one column per group.
+    dist_from_target:
+        Frame for delta plots, one column per group.
+    """
+
+    if d_to == '':
+        t_max = jobs[['submit', 'start', 'end', 'eligible']].max(axis=1)
+        d_to = str(t_max.max())
+
+    with stage('group_use.prepare', rows_in=len(jobs)) as prepare:
+        codes, groups = _group_codes(jobs, by, sort)
+        jobs = jobs.assign(group_code=codes)
+        use_units = [use_unit] if isinstance(use_unit, str) else list(use_unit)
+        jobs, weights = _prepare_jobs(jobs, d_to, use_units, job_state, time_ref)
+        in_group = (jobs['group_code'] >= 0).to_numpy()
+        jobs = jobs.loc[in_group]
+        weights = weights.loc[in_group]
+        prepare.rows_out = len(jobs)
+
+    with stage('group_use.sweep', rows_in=len(jobs)) as sweep:
+        if isinstance(use_unit, str):
+            weights = weights[use_unit]
+        bins, queued, running = sweep_use(jobs, weights,
+                                          grouper_interval, usage_interval,
+                                          group_codes=jobs['group_code'],
+                                          n_groups=len(groups))
+        sweep.rows_out = len(bins)
+
+    with stage('group_use.target', rows_in=len(bins)) as targeting:
+        # Bins outside of the job records of a group count as zero
+        index = bins.union(_period_index(d_from, d_to))
+        columns = groups if isinstance(use_unit, str) else _unit_columns(groups, use_units)
+        queued = pd.DataFrame(_by_bin(queued), index=bins, columns=columns)
+        queued = queued.reindex(index).fillna(0)
+        running = pd.DataFrame(_by_bin(running), index=bins, columns=columns)
+        running = running.reindex(index).fillna(0)
+
+        clust, dist_from_target = _dist_from_target(running, target, d_from, d_to)
+        targeting.rows_out = len(running)
+
+    if long_form:
+        queued.index.name = 'datetime'
+        running.index.name = 'datetime'
+        queued = queued.unstack().rename('queued')
+        running = running.unstack().rename('running')
+        dist_from_target = dist_from_target.unstack().rename(
+            'dist_from_target')
+        if not isinstance(use_unit, str):
+            queued, running, dist_from_target = (
+                series.unstack('use_unit')[use_units].rename_axis(columns=None)
+                for series in (queued, running, dist_from_target))
+
+    return clust, queued, running, dist_from_target
+
+
+def _by_bin(means):
+    """Sweep means as rows by bin, and columns by group then unit."""
+    means = np.moveaxis(means, 1, 0)
+    return means.reshape(len(means), -1)
+
+
+def _unit_columns(groups, use_units):
+    """Group columns with a last level for every use unit."""
+    keys = [(group if isinstance(group, tuple) else (group,)) + (unit,)
+            for group in groups for unit in use_units]
+    return pd.MultiIndex.from_tuples(keys, names=list(groups.names) + ['use_unit'])
+
+
+def _group_codes(jobs, by, sort=True):
+    """Exact group code of every job and the index of group keys.
+
+    Jobs with a missing key are not part of any group and get code -1.
+    """
+
+    if isinstance(by, str):
+        by = [by]
+    if len(by) == 1:
+        keys = jobs[by[0]]
+    else:
+        keys = pd.MultiIndex.from_frame(jobs[by])
+    codes, groups = pd.factorize(keys, sort=sort)
+    if len(by) == 1:
+        groups = pd.Index(groups, name=by[0])
+    else:
+        groups.names = by
+    return np.asarray(codes), groups
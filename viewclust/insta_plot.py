@@ -1,10 +1,13 @@
 import plotly.graph_objects as go
 import sys
+from viewclust.downsample import downsample, bucket_means, top_users, scatter
 
 
 def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
                fig_out='', y_label='Usage', fig_title='', query_bounds=True, 
-		running=[], queued=[], submit_run=[], submit_req=[], user_run=[]):
+		running=[], queued=[], submit_run=[], submit_req=[], user_run=[],
+               max_points=0, downsample_method='lttb', gl_threshold=0,
+               max_users=0):
     """Instantaneous usage plot.
 
     This function is deprecated as of v0.3.0.
@@ -48,6 +51,22 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         Draws an orange line representing what usage would have looked like
         if jobs had started instantly and ran for their requested duration. Allows for easier interpretation of
         the queued series. Defaults to not plotting.
+    user_run: DataFrame, optional
+        Stacked running resources with one column per user.
+        See get_users_run. Defaults to not plotting.
+    max_points: int, optional
+        Caps the points of every trace, keeping peaks. 0 plots every point.
+        Defaults to 0.
+    downsample_method: str, optional
+        How line traces are capped: {'lttb', 'minmax'}. Stacked users are
+        averaged over equal buckets. See viewclust.downsample.
+        Defaults to 'lttb'.
+    gl_threshold: int, optional
+        Traces with more points are drawn with WebGL, e.g. 10000 for
+        multi-year minutely series. 0 never uses WebGL. Defaults to 0.
+    max_users: int, optional
+        Only stacks the users with the most usage and sums the others into
+        an 'other' band. 0 stacks every user. Defaults to 0.
 
     See Also
     -------
@@ -67,14 +86,19 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         cores_queued_tmp = cores_queued_tmp.resample(resample_str).sum()
         cores_running_tmp = cores_running_tmp.resample(resample_str).sum()
 
+    def points(series):
+        series = downsample(series, max_points, downsample_method)
+        return series.index, series
+
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=clust_info_tmp.index, y=clust_info_tmp,
+    fig.add_trace(scatter(*points(clust_info_tmp), gl_threshold,
                              fill='tozeroy',
                              mode='none',
                              name='Allocation',
                              fillcolor='rgba(180, 180, 180, .3)'))
 
     if len(user_run) > 0:
+        user_run = bucket_means(top_users(user_run, max_users), max_points)
         for user in user_run:
             fig.add_trace(go.Scatter(
                 x=user_run.index, y=user_run[user],
@@ -86,7 +110,7 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
                 stackgroup='use'  # define stack group
                 ))
 
-    fig.add_trace(go.Scatter(x=cores_queued_tmp.index, y=cores_queued_tmp,
+    fig.add_trace(scatter(*points(cores_queued_tmp), gl_threshold,
                              mode='lines',
                              name='Resources queued',
                              marker_color='rgba(160,160,220, .8)'))
@@ -95,7 +119,7 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         if resample_str != '':
             running_tmp = running_tmp.resample(resample_str).sum()
 
-        fig.add_trace(go.Scatter(x=running_tmp.index, y=running_tmp,
+        fig.add_trace(scatter(*points(running_tmp), gl_threshold,
                              	mode='lines',
                              	name='Resources running',
                              	marker_color='rgba(80,240,80, .8)'))
@@ -105,7 +129,7 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         if resample_str != '':
             queued_tmp = queued_tmp.resample(resample_str).sum()
 
-        fig.add_trace(go.Scatter(x=queued_tmp.index, y=queued_tmp,
+        fig.add_trace(scatter(*points(queued_tmp), gl_threshold,
                              	mode='lines',
                              	name='Resources queued',
                              	marker_color='rgba(80,80,80, .8)'))
@@ -115,8 +139,7 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         if resample_str != '':
             submit_run_tmp = submit_run_tmp.resample(resample_str).sum()
 
-        fig.add_trace(go.Scatter(x=submit_run_tmp.index,
-                                 y=submit_run_tmp,
+        fig.add_trace(scatter(*points(submit_run_tmp), gl_threshold,
                                  mode='lines',
                                  name='Resources run at submit (elapsed)',
                                  marker_color='rgba(220,80,80, .8)'))
@@ -126,12 +149,12 @@ def insta_plot(clust_info, cores_queued, cores_running, resample_str='',
         if resample_str != '':
             submit_req_tmp = submit_req_tmp.resample(resample_str).sum()
 
-        fig.add_trace(go.Scatter(x=submit_req_tmp.index, y=submit_req_tmp,
+        fig.add_trace(scatter(*points(submit_req_tmp), gl_threshold,
                              	mode='lines',
                              	name='Resources run at submit (timelimit)',
                              	marker_color='rgba(220,160,00, .8)'))
 
-    fig.add_trace(go.Scatter(x=cores_running_tmp.index, y=cores_running_tmp,
+    fig.add_trace(scatter(*points(cores_running_tmp), gl_threshold,
                              mode='lines',
                              name='Resources running',
                              marker_color='rgba(80,80,220, .8)'))
@@ -1,12 +1,19 @@
+import warnings
 from datetime import datetime
+from functools import lru_cache
 import numpy as np
 import pandas as pd
-from viewclust.target_series import target_series
+from viewclust.target_series import TargetSteps
+from viewclust.sweep import sweep_use
+from viewclust.profiling import stage
+from viewclust.serialize import serialize
+from viewclust.tres import tres_matrix
+from viewclust.billing import billing_profiles, equivalent_use
 
 
 def job_use(jobs, d_from, target, d_to='', use_unit='cpu', job_state='all',
             time_ref='', grouper_interval='S', usage_interval='H', serialize_queued='', serialize_running='',
-            serialize_dist=''):
+            serialize_dist='', engine='sweep'):
     """Takes a DataFrame full of job information and
        returns usage based on specified unit.
 
@@ -17,9 +24,12 @@ def job_use(jobs, d_from, target, d_to='', use_unit='cpu', job_state='all',
     -------
     jobs: DataFrame
         Job DataFrame typically generated by the ccmnt package.
-    use_unit: str, optional
+    use_unit: str or list of str, optional
         Usage unit to examine.
-        One of: {'cpu', 'cpu-eqv', 'gpu', 'gpu-eqv','gpu-eqv-cdr'}.
+        One of: {'cpu', 'gpu', 'billing'} or a registered billing profile:
+        {'cpu-eqv', 'gpu-eqv','gpu-eqv-cdr'}. See viewclust.billing.
+        A list of units returns frames with one column per unit, all
+        calculated in a single pass over the job events.
         Defaults to 'cpu'.
     job_state: str, optional
         The job state to include in measurement:
@@ -53,9 +63,19 @@ def job_use(jobs, d_from, target, d_to='', use_unit='cpu', job_state='all',
             {'S','min', 'H'}. 
     debugging: boolean, optional
         Boolean for reporting progress to stdout. Default False.
+    engine: str, optional
+        How instantaneous usage is calculated: {'sweep', 'grouper'}.
+        sweep: Time weighted means computed directly from sorted job events.
+            Memory scales with the number of jobs and output bins.
+            usage_interval must be a fixed frequency.
+        grouper: Per grouper_interval series that is cumulatively summed and
+            then resampled. Memory scales with the length of the query period.
+        Defaults to 'sweep'.
     serialize_running, serialize_queued, serialize_dist: str, optional
-        Pickles given structure with argument as a name.
-        If left empty, pickle procedure is skipped.
+        Serializes given structure with argument as a name. The format is
+        inferred from the extension, e.g. '.parquet' or '.feather', and is
+        a pickle otherwise. See viewclust.serialize.
+        If left empty, serialization is skipped.
         Defaults to empty.
 
     Returns
@@ -68,15 +88,139 @@ def job_use(jobs, d_from, target, d_to='', use_unit='cpu', job_state='all',
     running:
         Frame of running resources
     dist_from_target:
-        Series for delta plots
+        Series for delta plots. Cumulative running usage minus cumulative
+        target, both accumulated from d_from.
     """
 
-    # d_to boilerplate
-    # IF D_TO IS EMPTY IT SHOULD BE SET TO LATEST KNOWN STATE
-    # CHANGE TIME (SUBMIT,START,END) IN THE JOB RECORDS.
-    if d_to == '':
-        t_max = jobs[['submit', 'start', 'end', 'eligible']].max(axis=1)
-        d_to = str(t_max.max())
+    with stage('job_use', rows_in=len(jobs)) as timed:
+        # d_to boilerplate
+        # IF D_TO IS EMPTY IT SHOULD BE SET TO LATEST KNOWN STATE
+        # CHANGE TIME (SUBMIT,START,END) IN THE JOB RECORDS.
+        if d_to == '':
+            t_max = jobs[['submit', 'start', 'end', 'eligible']].max(axis=1)
+            d_to = str(t_max.max())
+
+        use_units = [use_unit] if isinstance(use_unit, str) else list(use_unit)
+        with stage('job_use.prepare', rows_in=len(jobs)) as prepare:
+            jobs, weights = _prepare_jobs(jobs, d_to, use_units, job_state, time_ref)
+            prepare.rows_out = len(jobs)
+
+        if engine == 'sweep':
+            with stage('job_use.sweep', rows_in=len(jobs)) as sweep:
+                bins, queued, running = sweep_use(jobs, weights, grouper_interval,
+                                                  usage_interval)
+                queued = pd.DataFrame(queued[0], index=bins, columns=use_units)
+                running = pd.DataFrame(running[0], index=bins, columns=use_units)
+                queued = queued.dropna(how='all')
+                running = running.dropna(how='all')
+                if isinstance(use_unit, str):
+                    queued = queued[use_unit].rename('use_unit')
+                    running = running[use_unit].rename('use_unit')
+                sweep.rows_out = len(running)
+        elif engine == 'grouper':
+            if not isinstance(use_unit, str):
+                raise AttributeError('grouper engine only supports a single use_unit')
+            jobs = jobs.assign(use_unit=weights[use_unit])
+
+            with stage('job_use.grouper', rows_in=len(jobs)) as grouper:
+                # Prepare dataframes for resampling
+                jobs_submit = jobs[['submit','use_unit']].set_index('submit')
+                jobs_start  = jobs[['start', 'use_unit']].set_index('start')
+                jobs_end    = jobs[['end',   'use_unit']].set_index('end')
+
+                # Calculate instantaneous usage
+                jobs_submit = jobs_submit.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
+                jobs_start  =  jobs_start.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
+                jobs_end    =    jobs_end.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
+                grouper.rows_out = len(jobs_start)
+
+            with stage('job_use.cumsum', rows_in=len(jobs_start)):
+                running =  jobs_start.subtract(   jobs_end, fill_value=0 ).cumsum()
+                queued  = jobs_submit.subtract( jobs_start, fill_value=0 ).cumsum()
+
+            with stage('job_use.resample', rows_in=len(running)) as resample:
+                # Resample by the hour
+                running = running.resample( usage_interval ).mean()
+                queued  =  queued.resample( usage_interval ).mean()
+
+                # Fill values for sparse job records. The resampling above will result in NaNs
+                running = running.fillna(method='ffill')
+                queued  =  queued.fillna(method='ffill')
+                resample.rows_out = len(running)
+        else:
+            raise AttributeError('invalid engine')
+
+        with stage('job_use.target', rows_in=len(running)) as targeting:
+            queued = _with_period(queued, d_from, d_to)
+            running = _with_period(running, d_from, d_to)
+
+            clust, dist_from_target = _dist_from_target(running, target, d_from, d_to)
+            targeting.rows_out = len(running)
+        timed.rows_out = len(running)
+
+        if serialize_running != '':
+            serialize(running, serialize_running)
+        if serialize_queued != '':
+            serialize(queued, serialize_queued)
+        if serialize_dist != '':
+            serialize(dist_from_target, serialize_dist)
+
+    return clust, queued, running, dist_from_target
+
+
+@lru_cache(maxsize=16)
+def _period_index(d_from, d_to):
+    """Hourly points of the query period, as in target_series."""
+    return pd.date_range(d_from, d_to, freq='H')
+
+
+def _with_period(usage, d_from, d_to):
+    """Usage with every hour of the query period, zero where not recorded."""
+    index = usage.index.union(_period_index(d_from, d_to))
+    usage = usage.reindex(index).fillna(0)
+    if isinstance(usage, pd.Series):
+        # Unnamed, as when a series of zeros was added
+        usage.name = None
+    return usage
+
+
+def _dist_from_target(running, target, d_from, d_to):
+    """Target series and cumulative distance of running from the target.
+
+    Both running and the target are sliced to the query period before they
+    are accumulated. An int target is accumulated analytically at the
+    running bins with TargetSteps.cumulative, and the returned target
+    shares the cached hourly index of the query period.
+    """
+
+    # Target: If int, calculate it, else use the variable passed
+    # (should be a series)
+    sum_running = running.loc[d_from:d_to].cumsum()
+    sum_running.index.name = 'datetime'
+    if isinstance(target, int):
+        clust = pd.Series(float(target), index=_period_index(d_from, d_to))
+        sum_target = TargetSteps([(d_from, d_to, target)]).cumulative(
+            sum_running.index)
+    else:
+        clust = target
+        sum_target = np.cumsum(clust.loc[d_from:d_to])
+
+    return clust, sum_running.sub(sum_target, axis=0)
+
+
+def _prepare_jobs(jobs, d_to, use_units=('cpu',), job_state='all', time_ref=''):
+    """Filter and shift job records, then weigh them by each use unit.
+
+    Shared by job_use and the grouped usage functions. See job_use for the
+    meaning of the parameters. The caller's frame is never modified.
+
+    Returns
+    -------
+    jobs:
+        Filtered and time shifted job records, sorted by submit time.
+    weights:
+        Frame aligned with jobs, with one float column per use unit.
+    """
 
     # Filter on job state. Different from reason so it is safe.
     if job_state == 'complete':
@@ -119,90 +263,41 @@ def job_use(jobs, d_from, target, d_to='', use_unit='cpu', job_state='all',
 
     jobs = jobs.sort_values(by=['submit'])
 
-    if use_unit == 'cpu':
-        jobs['use_unit'] = jobs['reqcpus']
-    elif use_unit == 'cpu-eqv':  # TRESBillingWeights=CPU=1.0,Mem=0.25G
-        jobs['mem_scale'] = (jobs['mem'] / 1024) * .25
-        jobs['use_unit'] = jobs[['mem_scale', 'reqcpus']].max(axis=1)
-    elif 'gpu' in use_unit:
-        jobs['ngpus'] = jobs['reqtres'].str.extract(
-            r'gpu=(\d+)').fillna(0).astype('int64')
-        if use_unit == 'gpu':
-            jobs['use_unit'] = jobs['ngpus']
-        elif use_unit == 'gpu-eqv':
-            # Beluga and Graham:
-            # TRESBillingWeights=CPU=0.0625,Mem=0.015625G,GRES/gpu=1.0,GRES/gpu=1.0
-            jobs['cpu_scale'] = jobs['reqcpus'] * 0.0625
-            jobs['mem_scale'] = (jobs['mem'] / 1024) * 0.015625
-            jobs['use_unit'] = jobs[['cpu_scale', 'mem_scale', 'ngpus']].max(
-                axis=1)
-        elif use_unit == 'gpu-eqv-cdr':
-            # Cedar: TRESBillingWeights=CPU=0.1667,Mem=0.03125G,GRES/gpu=1.0
-            jobs['cpu_scale'] = jobs['reqcpus'] * 0.1667
-            jobs['mem_scale'] = (jobs['mem'] / 1024) * 0.03125
-            jobs['use_unit'] = jobs[['cpu_scale', 'mem_scale', 'ngpus']].max(
-                axis=1)
-        else:
-            raise AttributeError('invalid GPU use_unit')
-    elif use_unit == 'billing':
-        jobs['billing'] = jobs['reqtres'].str.extract(
-            r'billing=(\d+)').fillna(0).astype('int64')
-        if jobs['billing'].isnull().any():
-            raise AttributeError('There is no "billing" string in the reqtres')
-        else:
-            jobs['use_unit'] = jobs['billing']
-    else:
-        raise AttributeError('invalid use_unit')
-
-    # Prepare dataframes for resampling
-    jobs_submit = jobs[['submit','use_unit']].set_index('submit')
-    jobs_start  = jobs[['start', 'use_unit']].set_index('start')
-    jobs_end    = jobs[['end',   'use_unit']].set_index('end')
+    return jobs, _unit_weights(jobs, use_units)
 
-    # Calculate instantaneous usage
-    jobs_submit = jobs_submit.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
-    jobs_start  =  jobs_start.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
-    jobs_end    =    jobs_end.groupby( pd.Grouper(freq=grouper_interval) )['use_unit'].sum().fillna(0)
 
-    running =  jobs_start.subtract(   jobs_end, fill_value=0 ).cumsum()
-    queued  = jobs_submit.subtract( jobs_start, fill_value=0 ).cumsum()
+def _unit_weights(jobs, use_units):
+    """Frame with the usage of every job in each of the given units.
 
-    # Resample by the hour
-    running = running.resample( usage_interval ).mean()
-    queued  =  queued.resample( usage_interval ).mean()
-
-    # Fill values for sparse job records. The resampling above will result in NaNs
-    running = running.fillna(method='ffill')
-    queued  =  queued.fillna(method='ffill')
-
-    baseline = target_series([(d_from, d_to, 0)])
-    queued = queued.add(baseline, fill_value=0)
-    running = running.add(baseline, fill_value=0)
-
-    # Target: If int, calculate it, else use the variable passed
-    # (should be a series)
-    clust = pd.DataFrame()
-    if isinstance(target, int):
-        clust = target_series([(d_from, d_to, target)])
-    else:
-        clust = target
-
-    sum_target = np.cumsum(clust)
-    sum_running = np.cumsum(running)
-
-    # New workaround for job record problems
-    sum_target = sum_target.loc[d_from:d_to]
+    The TRES of the jobs are parsed once and shared by every unit.
+    Equivalent units are looked up in viewclust.billing.billing_profiles.
+    """
 
-    sum_running.index.name = 'datetime'
-    sum_running = sum_running.loc[d_from:d_to]
+    weights = pd.DataFrame(index=jobs.index)
+    if any(use_unit != 'cpu' for use_unit in use_units):
+        tres = tres_matrix(jobs)
 
-    dist_from_target = (sum_running - sum_target)
+    for use_unit in use_units:
+        if use_unit == 'cpu':
+            weights[use_unit] = jobs['reqcpus']
+        elif use_unit == 'gpu':
+            weights[use_unit] = tres['gres/gpu'] if 'gres/gpu' in tres.columns else 0
+        elif use_unit == 'billing':
+            if 'billing' not in tres.columns:
+                # Jobs without a billing TRES count as zero, as they always have
+                warnings.warn('There is no "billing" string in the reqtres, '
+                              'billing usage is zero')
+                weights[use_unit] = 0
+            else:
+                weights[use_unit] = tres['billing']
+        elif use_unit not in billing_profiles:
+            raise AttributeError('invalid use_unit')
 
-    if serialize_running != '':
-        running.to_pickle(serialize_running)
-    if serialize_queued != '':
-        queued.to_pickle(serialize_queued)
-    if serialize_dist != '':
-        dist_from_target.to_pickle(serialize_dist)
+    profiles = [use_unit for use_unit in use_units
+                if use_unit in billing_profiles and use_unit not in weights.columns]
+    if profiles:
+        equivalent = equivalent_use(tres, profiles)
+        for use_unit in profiles:
+            weights[use_unit] = equivalent[use_unit]
 
-    return clust, queued, running, dist_from_target
+    return weights[list(use_units)].astype('float64')
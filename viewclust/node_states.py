@@ -0,0 +1,243 @@
+import os
+import numpy as np
+import pandas as pd
+from viewclust.node_use import _node_sums, _node_ratios
+from viewclust.serialize import _arrow
+
+
+class NodeStateStore:
+    """Compact in memory store of node polls with grouped usage statistics.
+
+    Poll times, and every text column such as node and partition, are kept
+    as categorical codes, counts as int32 and other numbers as float32.
+    Poll times repeat for every node, so a store is typically close to an
+    order of magnitude smaller than the polling frame it was built from.
+
+    Parameters
+    -------
+    node_states: DataFrame, optional
+        Node polls indexed by poll time, with a_cpu, t_cpu, a_mem and t_mem
+        columns plus any grouping columns, e.g. node and partition.
+
+    Examples
+    -------
+    store = NodeStateStore(node_states)
+    cores_total, cores_perc, mem_perc, max_perc = store.aggregate('partition')
+    """
+
+    def __init__(self, node_states=None):
+        self._chunks = []
+        self._frame = None
+        if node_states is not None:
+            self.append(node_states)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def append(self, node_states):
+        """Add more polls to the store."""
+
+        self._chunks.append(compact_node_states(node_states))
+        self._frame = None
+
+    @property
+    def frame(self):
+        """Every poll as a compact frame, with the poll time in a time column."""
+
+        if self._frame is None:
+            if not self._chunks:
+                return compact_node_states(pd.DataFrame(
+                    columns=['a_cpu', 't_cpu', 'a_mem', 't_mem'],
+                    index=pd.DatetimeIndex([])))
+            self._frame = _concat_compact(self._chunks)
+            self._chunks = [self._frame]
+        return self._frame
+
+    def memory_usage(self):
+        """Bytes held by the store."""
+
+        return int(self.frame.memory_usage(deep=True).sum())
+
+    def aggregate(self, by=None, freq='H'):
+        """node_use statistics, optionally split by groups of nodes.
+
+        Parameters
+        -------
+        by: str or list of str, optional
+            Columns to split statistics by, e.g. 'partition' or
+            ['partition', 'node']. If None, statistics are cluster wide.
+        freq: pandas freq str, optional
+            Fixed frequency of the returned statistics. Defaults to 'H'.
+
+        Returns
+        -------
+        cores_total, cores_perc, mem_perc, max_perc:
+            See node_use. Series if by is None, else frames with one
+            column per group.
+        """
+
+        frame = self.frame
+        if isinstance(by, str):
+            by = [by]
+
+        # Bin of every distinct poll time, then of every poll
+        times = frame['time'].cat.categories
+        bins = times.floor(freq)
+        binned = pd.Series(bins.take(frame['time'].cat.codes.to_numpy()),
+                           index=frame.index, name='datetime')
+
+        keys = [binned] + [frame[column] for column in by or []]
+        sums = _node_sums(frame).groupby(keys, observed=True, sort=True).sum()
+        return _grouped_ratios(sums, by, freq)
+
+
+def node_state_chunks(paths, chunksize=100000, time_column='time'):
+    """Stream polls from CSV or Parquet polling files in chunks.
+
+    Parameters
+    -------
+    paths: str or list of str
+        Polling files, e.g. rotated dumps in time order. Files ending in
+        .parquet or .pq are read as Parquet, which requires pyarrow, and
+        every other file as CSV.
+    chunksize: int, optional
+        Maximum number of polls per chunk. Defaults to 100000.
+    time_column: str, optional
+        Column, or restored index, holding the poll time. A ValueError is
+        raised for files without it. Defaults to 'time'.
+
+    Yields
+    -------
+    DataFrame
+        Polls indexed by poll time, as expected by node_use.
+    """
+
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        if os.path.splitext(path)[1].lower() in ('.parquet', '.pq'):
+            _arrow()
+            import pyarrow.parquet as pq
+            batches = (batch.to_pandas() for batch in
+                       pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+        else:
+            batches = pd.read_csv(path, chunksize=chunksize)
+        for chunk in batches:
+            if time_column in chunk.columns:
+                chunk = chunk.set_index(time_column)
+            elif chunk.index.name != time_column:
+                # Parquet files written from an indexed frame restore it
+                raise ValueError(f'no {time_column!r} column in {path}')
+            chunk.index = pd.to_datetime(chunk.index)
+            yield chunk
+
+
+def stream_node_use(paths, by=None, freq='H', chunksize=100000,
+                    time_column='time'):
+    """node_use statistics of polling files too large to load at once.
+
+    Every chunk from node_state_chunks is folded into per bin weighted
+    sums. Completed bins are set aside and only the last, partial bin is
+    carried into the next chunk, so memory is bound by the chunk size and
+    the number of output bins.
+
+    Parameters
+    -------
+    paths: str or list of str
+        Polling files, see node_state_chunks. Files out of time order are
+        still aggregated correctly, they only carry more partial bins.
+    by, freq:
+        See NodeStateStore.aggregate.
+    chunksize, time_column:
+        See node_state_chunks.
+
+    Returns
+    -------
+    cores_total, cores_perc, mem_perc, max_perc:
+        See NodeStateStore.aggregate.
+    """
+
+    if isinstance(by, str):
+        by = [by]
+    levels = ['datetime'] + (by or [])
+
+    completed = []
+    carried = None
+    for chunk in node_state_chunks(paths, chunksize, time_column):
+        keys = [chunk.index.floor(freq).rename('datetime')]
+        keys += [chunk[column].to_numpy() for column in by or []]
+        sums = _node_sums(chunk).groupby(keys, sort=False).sum()
+        sums.index.names = levels
+        if carried is not None:
+            sums = pd.concat([carried, sums]).groupby(level=levels, sort=False).sum()
+        if sums.empty:
+            continue
+
+        bins = sums.index.get_level_values('datetime')
+        partial = bins == bins.max()
+        completed.append(sums[~partial])
+        carried = sums[partial]
+
+    if carried is not None:
+        completed.append(carried)
+    if not completed:
+        raise ValueError('no node polls in %s' % (paths,))
+    sums = pd.concat(completed).groupby(level=levels, sort=True).sum()
+    return _grouped_ratios(sums, by, freq)
+
+
+def compact_node_states(node_states):
+    """Polling frame with compact dtypes and the poll time as a column.
+
+    Text columns become categoricals, integer columns that fit become
+    int32 and other numeric columns float32.
+    """
+
+    compact = {'time': pd.Categorical(pd.DatetimeIndex(node_states.index))}
+    for column in node_states.columns:
+        values = node_states[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+            compact[column] = values.astype('category').array
+        elif pd.api.types.is_integer_dtype(values) and _fits_int32(values):
+            compact[column] = values.to_numpy(dtype=np.int32)
+        elif pd.api.types.is_numeric_dtype(values):
+            compact[column] = values.to_numpy(dtype=np.float32)
+        else:
+            compact[column] = values.to_numpy()
+    return pd.DataFrame(compact)
+
+
+def _grouped_ratios(sums, by, freq):
+    """node_use statistics from weighted sums grouped by bin and by."""
+
+    bins = sums.index.get_level_values('datetime')
+    full = pd.date_range(bins.min(), bins.max(), freq=freq, name='datetime')
+    if by:
+        sums = sums.unstack(by, fill_value=0)
+        # Plain group labels, whether or not they were categorical
+        sums.columns = pd.MultiIndex.from_arrays(
+            [np.asarray(sums.columns.get_level_values(i))
+             for i in range(sums.columns.nlevels)], names=sums.columns.names)
+    sums = sums.reindex(full, fill_value=0)
+    return _node_ratios(sums)
+
+
+def _fits_int32(values):
+    info = np.iinfo(np.int32)
+    return len(values) == 0 or (values.min() >= info.min and values.max() <= info.max)
+
+
+def _concat_compact(chunks):
+    """Concatenate compact frames, merging the categories of every column."""
+
+    if len(chunks) == 1:
+        return chunks[0]
+    frame = {}
+    for column in chunks[0].columns:
+        parts = [chunk[column] for chunk in chunks]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            frame[column] = pd.api.types.union_categoricals(
+                [part.array for part in parts], sort_categories=True)
+        else:
+            frame[column] = np.concatenate([part.to_numpy() for part in parts])
+    return pd.DataFrame(frame)
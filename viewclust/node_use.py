@@ -1,10 +1,25 @@
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
+from viewclust.profiling import stage, profile, print_stage
 
 
-def node_use(node_states, debugging=False):
+def node_use(node_states, debugging=False, freq='H'):
     """Calculate node usage statistics based on polling database.
 
-    Consider resampling data to get into hour format for easier plotting.
+    Every statistic is calculated in a single grouped pass over weighted
+    sums. node_states is not modified.
+
+    Parameters
+    -------
+    node_states: DataFrame
+        Node polls indexed by poll time, with a_cpu, t_cpu, a_mem and t_mem
+        columns.
+    debugging: boolean, optional
+        Prints the time and rows of every stage, see viewclust.profiling.
+        Defaults to False.
+    freq: pandas freq str, optional
+        Frequency of the returned series. Defaults to 'H'.
 
     Returns
     -------
@@ -20,27 +35,46 @@ def node_use(node_states, debugging=False):
         Series, weighted average (cpus in node)
     """
 
-    if debugging:
-        print('Calculating percentage measures...')
-    node_states['p_cpu'] = node_states['a_cpu']/node_states['t_cpu']
-    node_states['p_mem'] = node_states['a_mem']/node_states['t_mem']
-    node_states['p_max'] = node_states[['p_cpu', 'p_mem']].max(axis=1)
-
-    if debugging:
-        print('Calculating sum measures...')
-    cores_total = node_states.groupby(pd.Grouper(freq='H')).sum()['t_cpu']
-
-    # Quick weighted average
-    def w_avg(group, avg_name, weight_name):
-        data = group[avg_name]
-        weights = group[weight_name]
-        return (data * weights).sum() / weights.sum()
-
-    cores_perc = node_states.groupby(pd.Grouper(freq='H')).apply(
-        w_avg, "p_cpu", "t_cpu")
-    mem_perc = node_states.groupby(pd.Grouper(freq='H')).apply(
-        w_avg, "p_mem", "t_cpu")
-    max_perc = node_states.groupby(pd.Grouper(freq='H')).apply(
-        w_avg, "p_max", "t_cpu")
+    with profile(print_stage) if debugging else nullcontext(), \
+            stage('node_use', rows_in=len(node_states)) as timed:
+        with stage('node_use.sums', rows_in=len(node_states)):
+            sums = _node_sums(node_states)
+        with stage('node_use.grouper', rows_in=len(sums)) as grouper:
+            sums = sums.groupby(pd.Grouper(freq=freq)).sum()
+            grouper.rows_out = len(sums)
+        with stage('node_use.ratios', rows_in=len(sums)):
+            ratios = _node_ratios(sums)
+        timed.rows_out = len(sums)
+    return ratios
+
+
+# Weighted sums node_use statistics are ratios of
+_sum_columns = ['t_cpu', 'w_cpu', 'w_mem', 'w_max']
+
+
+def _node_sums(node_states):
+    """Per poll terms of the node_use weighted averages.
+
+    Every percentage is weighted by t_cpu, so each average is the sum of
+    its w_ column over the sum of t_cpu.
+    """
+
+    t_cpu = node_states['t_cpu'].to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_cpu = node_states['a_cpu'].to_numpy(dtype='float64') / t_cpu
+        p_mem = (node_states['a_mem'].to_numpy(dtype='float64')
+                 / node_states['t_mem'].to_numpy(dtype='float64'))
+        p_max = np.fmax(p_cpu, p_mem)
+        return pd.DataFrame({'t_cpu': t_cpu, 'w_cpu': p_cpu * t_cpu,
+                             'w_mem': p_mem * t_cpu, 'w_max': p_max * t_cpu},
+                            index=node_states.index, columns=_sum_columns)
+
+
+def _node_ratios(sums):
+    """node_use statistics from summed _node_sums terms."""
 
+    cores_total = sums['t_cpu']
+    cores_perc = sums['w_cpu'] / cores_total
+    mem_perc = sums['w_mem'] / cores_total
+    max_perc = sums['w_max'] / cores_total
     return cores_total, cores_perc, mem_perc, max_perc
@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Sinks receiving every stage record. Stages cost a single check while
+# there are none.
+_sinks = []
+_memory = {'track': False, 'started': False}
+_local = threading.local()
+# Per stage peaks need tracemalloc.reset_peak, new in Python 3.9
+_can_reset_peak = hasattr(tracemalloc, 'reset_peak')
+
+
+def stage(name, rows_in=None):
+    """Context manager timing one stage of the pipeline.
+
+    Reports a record to every sink on exit, see add_sink. While no sink is
+    registered a shared no-op stage is returned.
+
+    Parameters
+    -------
+    name: str
+        Stage name, e.g. 'sacct.tres'.
+    rows_in: int, optional
+        Number of rows going into the stage.
+
+    Examples
+    -------
+    with stage('sacct.tres', rows_in=len(records)) as timed:
+        records = parse(records)
+        timed.rows_out = len(records)
+    """
+
+    if not _sinks:
+        return _null_stage
+    return _Stage(name, rows_in)
+
+
+def add_sink(sink, memory=False):
+    """Report stage records to sink.
+
+    Parameters
+    -------
+    sink: callable
+        Called with the record of every finished stage, a dict with:
+            stage: name of the stage.
+            parent: name of the enclosing stage, or None.
+            depth: number of enclosing stages.
+            start: wall clock time the stage started at, in seconds.
+            seconds: elapsed wall time.
+            rows_in, rows_out: numbers of rows, or None if not reported.
+            peak_bytes: peak memory allocated during the stage, above the
+                memory allocated when it started, or None if memory is not
+                tracked.
+            failed: whether the stage raised.
+            thread: identifier of the thread running the stage.
+        E.g. a LoggingSink, a JsonTraceSink, print_stage or a function.
+    memory: bool, optional
+        Track peak allocated memory with tracemalloc, which slows down
+        allocations while enabled. Needs Python 3.9 or later, peak_bytes
+        is None otherwise. Defaults to False.
+    """
+
+    if memory:
+        _memory['track'] = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memory['started'] = True
+    _sinks.append(sink)
+
+
+def remove_sink(sink):
+    """Stop reporting to sink, and stop tracking memory with the last sink."""
+
+    if sink in _sinks:
+        _sinks.remove(sink)
+    if not _sinks:
+        _memory['track'] = False
+        if _memory['started']:
+            tracemalloc.stop()
+            _memory['started'] = False
+
+
+@contextmanager
+def profile(*sinks, memory=False):
+    """Report the stages run inside the block to the given sinks.
+
+    Examples
+    -------
+    with profile(JsonTraceSink('trace.json'), memory=True):
+        jobs = sacct_jobs(account, d_from)
+        job_use(jobs, d_from, target)
+    """
+
+    for sink in sinks:
+        add_sink(sink, memory=memory)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            remove_sink(sink)
+            if hasattr(sink, 'close'):
+                sink.close()
+
+
+def format_stage(record):
+    """One line summary of a stage record."""
+
+    line = '  ' * record['depth'] + f"{record['stage']}: {record['seconds']:.3f}s"
+    if record['rows_out'] is not None:
+        line += f", rows {record['rows_in']} -> {record['rows_out']}"
+    elif record['rows_in'] is not None:
+        line += f", rows {record['rows_in']}"
+    if record['peak_bytes'] is not None:
+        line += f", peak {record['peak_bytes'] / 1024 ** 2:.1f} MB"
+    if record['failed']:
+        line += ', failed'
+    return line
+
+
+def print_stage(record):
+    """Sink printing every stage, used by the debugging flags."""
+
+    print(format_stage(record))
+
+
+class LoggingSink:
+    """Sink logging every stage.
+
+    Parameters
+    -------
+    logger: str or Logger, optional
+        Defaults to the 'viewclust.profiling' logger.
+    level: int, optional
+        Defaults to logging.INFO.
+    """
+
+    def __init__(self, logger='viewclust.profiling', level=logging.INFO):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, format_stage(record))
+
+
+class JsonTraceSink:
+    """Sink writing stages to a trace file in the Chrome trace event format.
+
+    The file opens in chrome://tracing or Perfetto, with nested stages
+    drawn under their parents. Every stage is written as it finishes, so
+    the trace is readable up to a crash, and close completes the JSON.
+
+    Parameters
+    -------
+    path: str
+        Trace file, overwritten.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='UTF-8')
+        self._file.write('[')
+        self._first = True
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        args = {key: record[key] for key in ('rows_in', 'rows_out', 'peak_bytes')
+                if record[key] is not None}
+        if record['failed']:
+            args['failed'] = True
+        event = {'name': record['stage'], 'ph': 'X', 'pid': os.getpid(),
+                 'tid': record['thread'], 'ts': record['start'] * 1e6,
+                 'dur': record['seconds'] * 1e6, 'args': args}
+        with self._lock:
+            self._file.write(('\n' if self._first else ',\n') + json.dumps(event))
+            self._file.flush()
+            self._first = False
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.write('\n]\n')
+                self._file.close()
+
+
+class _NullStage:
+    """Stage doing nothing while no sink is registered."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    @property
+    def rows_out(self):
+        return None
+
+    @rows_out.setter
+    def rows_out(self, value):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('name', 'rows_in', 'rows_out', '_parent', '_wall', '_start',
+                 '_base', '_peak')
+
+    def __init__(self, name, rows_in):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self._base = None
+
+    def __enter__(self):
+        stack = _stack()
+        self._parent = stack[-1] if stack else None
+        if _memory['track'] and _can_reset_peak and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this stage, keep the parent's so far
+            if self._parent is not None and self._parent._base is not None:
+                self._parent._peak = max(self._parent._peak, peak)
+            tracemalloc.reset_peak()
+            self._base = self._peak = current
+        stack.append(self)
+        self._wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self._start
+        stack = _stack()
+        stack.pop()
+        peak_bytes = None
+        if self._base is not None and tracemalloc.is_tracing():
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            peak_bytes = peak - self._base
+            self._peak = peak
+
+        record = {'stage': self.name,
+                  'parent': None if self._parent is None else self._parent.name,
+                  'depth': len(stack), 'start': self._wall, 'seconds': seconds,
+                  'rows_in': self.rows_in, 'rows_out': self.rows_out,
+                  'peak_bytes': peak_bytes, 'failed': exc_type is not None,
+                  'thread': threading.get_ident()}
+        for sink in list(_sinks):
+            sink(record)
+        return False
+
+
+def _stack():
+    """Open stages of the current thread."""
+
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
@@ -0,0 +1,214 @@
+import json
+import os
+import pandas as pd
+
+# Keys in the Arrow schema metadata marking a stored Series and a
+# datetime index that was only named to be stored
+_series_key = b'viewclust.series'
+_unnamed_key = b'viewclust.unnamed_index'
+
+
+def serialize(obj, path, fmt=''):
+    """Write a frame or series to disk with a registered serializer.
+
+    Parameters
+    -------
+    obj: DataFrame or Series
+        Structure to write. Nullable Int64 and datetime64 dtypes are kept
+        by every format.
+    path: str
+        Output file name.
+    fmt: str, optional
+        One of the keys of serializers, e.g. {'pickle', 'parquet', 'feather'}.
+        If empty, inferred from the extension of path, falling back to pickle.
+    """
+
+    fmt = fmt if fmt != '' else _infer_format(path)
+    serializers[fmt][0](obj, path)
+
+
+def deserialize(path, fmt='', columns=None, time_range=None, time_column=''):
+    """Read a frame or series written by serialize.
+
+    Parameters
+    -------
+    path: str
+        File to read.
+    fmt: str, optional
+        Format of the file. If empty, inferred from the extension of path.
+    columns: list of str, optional
+        Only read these columns. Ignored for series.
+    time_range: tuple of date str, optional
+        Inclusive (from, to) bounds on time_column. Either bound can be
+        None. Pushed down to the reader where the format supports it.
+    time_column: str, optional
+        Column time_range applies to. If empty, applies to the datetime index,
+        which is what job_use outputs are stored with.
+
+    Returns
+    -------
+    DataFrame or Series
+    """
+
+    fmt = fmt if fmt != '' else _infer_format(path)
+    return serializers[fmt][1](path, columns, time_range, time_column)
+
+
+def register_serializer(fmt, writer, reader, extensions=()):
+    """Make a new format available to serialize and deserialize.
+
+    writer is called as writer(obj, path) and reader as
+    reader(path, columns, time_range, time_column).
+    """
+
+    serializers[fmt] = (writer, reader)
+    for extension in extensions:
+        extension_formats[extension] = fmt
+
+
+def _infer_format(path):
+    return extension_formats.get(os.path.splitext(path)[1].lower(), 'pickle')
+
+
+def _time_bounds(time_range):
+    if time_range is None:
+        return None, None
+    return [None if t in (None, '') else pd.to_datetime(t) for t in time_range]
+
+
+def _filter_time(frame, time_range, time_column):
+    start, end = _time_bounds(time_range)
+    times = frame.index if time_column == '' else frame[time_column]
+    mask = pd.Series(True, index=frame.index)
+    if start is not None:
+        mask &= (times >= start)
+    if end is not None:
+        mask &= (times <= end)
+    return frame[mask.to_numpy()]
+
+
+def _write_pickle(obj, path):
+    obj.to_pickle(path, protocol=4)
+
+
+def _read_pickle(path, columns, time_range, time_column):
+    obj = pd.read_pickle(path)
+    if columns is not None and isinstance(obj, pd.DataFrame):
+        obj = obj[columns]
+    if time_range is not None:
+        obj = _filter_time(obj, time_range, time_column)
+    return obj
+
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required for parquet and feather serialization')
+    return pyarrow
+
+
+def _to_table(obj):
+    pa = _arrow()
+    frame = obj
+    name = None
+    if isinstance(obj, pd.Series):
+        name = obj.name
+        frame = obj.to_frame(name='value' if name is None else str(name))
+    unnamed = isinstance(frame.index, pd.DatetimeIndex) and frame.index.name is None
+    if unnamed:
+        frame = frame.rename_axis('datetime')
+
+    table = pa.Table.from_pandas(frame)
+    metadata = dict(table.schema.metadata)
+    if isinstance(obj, pd.Series):
+        metadata[_series_key] = json.dumps({'name': name}).encode()
+    if unnamed:
+        metadata[_unnamed_key] = b'1'
+    return table.replace_schema_metadata(metadata)
+
+
+def _from_table(table):
+    obj = table.to_pandas()
+    metadata = table.schema.metadata or {}
+    if _series_key in metadata:
+        obj = obj.iloc[:, 0].rename(json.loads(metadata[_series_key])['name'])
+    if _unnamed_key in metadata:
+        obj.index.name = None
+    return obj
+
+
+def _index_column(schema, time_column):
+    if time_column != '':
+        return time_column
+    return schema.pandas_metadata['index_columns'][0]
+
+
+def _read_columns(schema, columns, time_column):
+    """Requested columns plus the pandas index so it can be restored."""
+    if columns is None or _series_key in (schema.metadata or {}):
+        return None
+    index_columns = [c for c in schema.pandas_metadata['index_columns']
+                     if isinstance(c, str)]
+    keep = list(columns) + [c for c in index_columns if c not in columns]
+    if time_column != '' and time_column not in keep:
+        keep.append(time_column)
+    return keep
+
+
+def _write_parquet(obj, path):
+    _arrow()
+    import pyarrow.parquet as pq
+    pq.write_table(_to_table(obj), path)
+
+
+def _read_parquet(path, columns, time_range, time_column):
+    _arrow()
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(path)
+
+    filters = None
+    start, end = _time_bounds(time_range)
+    if start is not None or end is not None:
+        column = _index_column(schema, time_column)
+        filters = []
+        if start is not None:
+            filters.append((column, '>=', start))
+        if end is not None:
+            filters.append((column, '<=', end))
+
+    table = pq.read_table(path, columns=_read_columns(schema, columns, time_column),
+                          filters=filters)
+    obj = _from_table(table)
+    if columns is not None and isinstance(obj, pd.DataFrame):
+        obj = obj[columns]
+    return obj
+
+
+def _write_feather(obj, path):
+    _arrow()
+    import pyarrow.feather as feather
+    feather.write_feather(_to_table(obj), path)
+
+
+def _read_feather(path, columns, time_range, time_column):
+    _arrow()
+    import pyarrow.feather as feather
+    import pyarrow.ipc as ipc
+    with ipc.open_file(path) as reader:
+        schema = reader.schema
+
+    table = feather.read_table(path, columns=_read_columns(schema, columns, time_column))
+    obj = _from_table(table)
+    if time_range is not None:
+        obj = _filter_time(obj, time_range, time_column)
+    if columns is not None and isinstance(obj, pd.DataFrame):
+        obj = obj[columns]
+    return obj
+
+
+serializers = {}
+extension_formats = {}
+register_serializer('pickle', _write_pickle, _read_pickle, ('.pkl', '.pickle'))
+register_serializer('parquet', _write_parquet, _read_parquet, ('.parquet', '.pq'))
+register_serializer('feather', _write_feather, _read_feather, ('.feather', '.arrow'))
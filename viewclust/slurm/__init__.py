@@ -1,2 +1,8 @@
-from .sacct_jobs import sacct_jobs
-from .mem_info import mem_info
\ No newline at end of file
+from .sacct_jobs import sacct_jobs, sacct_chunks
+from .mem_info import mem_info
+from .mem_efficiency import mem_efficiency, sacct_mem_records
+from .job_store import JobStore
+from .sacct_shards import sharded_sacct_records
+from .compact_jobs import compact_jobs, memory_report
+from .sacct_time import parse_sacct_times, parse_sacct_durations
+from .synthetic import synthetic_sacct_records, write_sacct_dump
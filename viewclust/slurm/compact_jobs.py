@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+from viewclust.tres import tres_separator
+
+# Columns of sacct_jobs frames read by viewclust functions
+used_columns = ['jobid', 'user', 'account', 'partition', 'qos', 'state',
+                'submit', 'start', 'end', 'eligible', 'timelimit', 'reqcpus',
+                'mem', 'reqtres', 'reqmem', 'ncpus', 'nnodes']
+
+# Low cardinality text columns stored as categoricals
+category_columns = ['user', 'account', 'partition', 'state', 'qos']
+
+
+def compact_jobs(jobs, drop_unused=True):
+    """Shrink a sacct_jobs frame with compact dtypes.
+
+    Low cardinality text columns become categoricals, and integer columns
+    use the smallest integer width that holds their values. Columns with
+    missing values stay nullable, all others become plain numpy dtypes.
+    Parsed TRES columns with whole values are stored as integers too.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job records from sacct_jobs, with or without slurm_names.
+    drop_unused: bool, optional
+        Drop columns no viewclust function reads, i.e. everything but
+        used_columns and the parsed reqtres columns. The reqtres string is
+        dropped as well when parsed reqtres columns are present.
+        Defaults to True.
+
+    Returns
+    -------
+    DataFrame
+    """
+
+    parsed_prefix = 'reqtres' + tres_separator
+    lower = {column: column.lower() for column in jobs.columns}
+    has_parsed = any(name.startswith(parsed_prefix) for name in lower.values())
+
+    compact = {}
+    for column in jobs.columns:
+        name = lower[column]
+        if drop_unused:
+            if name == 'reqtres' and has_parsed:
+                continue
+            if name not in used_columns and not name.startswith(parsed_prefix):
+                continue
+
+        values = jobs[column]
+        if name in category_columns:
+            compact[column] = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values) or (
+                pd.api.types.is_float_dtype(values) and _is_whole(values)):
+            compact[column] = _smallest_int(values)
+        else:
+            compact[column] = values
+    return pd.DataFrame(compact, index=jobs.index)
+
+
+def memory_report(before, after):
+    """Deep memory usage of every column of two versions of a frame.
+
+    Returns
+    -------
+    DataFrame
+        Bytes before and after, and their ratio, by column with a total row.
+        Columns missing from after have 0 bytes after.
+    """
+
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False)}).fillna(0)
+    report = report.reindex(list(before.columns)).fillna(0).astype('int64')
+    report.loc['total'] = report.sum()
+    report['ratio'] = report['after'] / report['before']
+    return report
+
+
+def _is_whole(values):
+    finite = values.dropna()
+    return bool(np.all(np.mod(finite.to_numpy(dtype='float64'), 1) == 0))
+
+
+def _smallest_int(values):
+    """Values with the narrowest integer dtype, nullable only if needed."""
+
+    if len(values) == 0:
+        return values
+    known = values.dropna()
+    if known.empty:
+        return values
+    lowest, highest = known.min(), known.max()
+    for dtype in (np.int8, np.int16, np.int32, np.int64):
+        info = np.iinfo(dtype)
+        if info.min <= lowest and highest <= info.max:
+            break
+    if len(known) == len(values):
+        return values.to_numpy(dtype=dtype)
+    return values.astype(pd.api.types.pandas_dtype(np.dtype(dtype).name.capitalize()))
@@ -0,0 +1,147 @@
+import sqlite3
+import pandas as pd
+from viewclust.slurm.sacct_jobs import _iter_slurm_records, sacct_fields, duplicate_job_def
+
+
+class JobStore:
+    """Local SQLite store of raw sacct records with a high-water mark.
+
+    Records are kept exactly as sacct prints them, keyed on
+    duplicate_job_def. Each refresh only asks sacct for jobs in any state
+    after the previous pull, which is every record that may have changed.
+
+    Parameters
+    -------
+    path: str
+        SQLite database file. Created if it does not exist.
+    overlap: pandas timedelta str, optional
+        Safety margin subtracted from the high-water mark when refreshing.
+        Defaults to '1H'.
+    chunksize: int, optional
+        Number of records parsed and upserted at a time while sacct output
+        is streamed into the store. Defaults to 100000.
+    """
+
+    def __init__(self, path, overlap='1H', chunksize=100000):
+        self.path = path
+        self.overlap = pd.Timedelta(overlap)
+        self.chunksize = chunksize
+        self._conn = sqlite3.connect(path)
+
+        columns = ', '.join(f'"{field}" TEXT' for field in sacct_fields)
+        key = ', '.join(f'"{field}"' for field in duplicate_job_def)
+        self._conn.execute(f'CREATE TABLE IF NOT EXISTS jobs ({columns}, PRIMARY KEY ({key}))')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.commit()
+
+    def _get_meta(self, key):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return None if row is None else pd.Timestamp(row[0])
+
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, value.isoformat()))
+
+    @property
+    def high_water_mark(self):
+        """Time (UTC) of the last successful pull, or None."""
+        return self._get_meta('high_water_mark')
+
+    @property
+    def covered_from(self):
+        """Earliest --start the store has been filled from, or None."""
+        return self._get_meta('covered_from')
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def refresh(self, d_from, records=None):
+        """Pull new and changed records from sacct into the store.
+
+        Parameters
+        -------
+        d_from: date str
+            Beginning of the period the store must cover. Earlier than the
+            current coverage triggers a full pull from d_from.
+        records: DataFrame or iterable of DataFrames, optional
+            Raw records to upsert instead of querying sacct.
+
+        Returns
+        -------
+        int
+            Number of records upserted.
+
+        Raises
+        -------
+        RuntimeError
+            If sacct fails. The coverage and high-water mark are left
+            unchanged, so the next refresh asks for the same period again.
+        """
+
+        d_from = pd.to_datetime(d_from)
+        pulled_at = pd.Timestamp.utcnow().tz_localize(None).floor('min')
+
+        covered_from = self.covered_from
+        if covered_from is None or d_from < covered_from:
+            query_from = d_from
+            covered_from = d_from
+        else:
+            query_from = max(d_from, self.high_water_mark - self.overlap)
+
+        if records is None:
+            records = _iter_slurm_records(query_from, self.chunksize)
+        if isinstance(records, pd.DataFrame):
+            records = [records]
+
+        count = 0
+        for chunk in records:
+            count += self.upsert(chunk)
+
+        # Only once the whole pull succeeded, a failed sacct raises above
+        self._set_meta('covered_from', covered_from)
+        self._set_meta('high_water_mark', pulled_at)
+        self._conn.commit()
+        return count
+
+    def upsert(self, records):
+        """Insert or replace raw records on the duplicate_job_def key.
+
+        A pending record is replaced once its job has started, even though
+        its Start field, and therefore its key, has changed.
+        """
+
+        if records.empty:
+            return 0
+
+        records = records.reindex(columns=sacct_fields)
+        records = records.astype(object).where(records.notna(), None)
+
+        started = records.loc[records['Start'].str.match(r'\d', na=False), ['JobID', 'Submit']]
+        self._conn.executemany(
+            'DELETE FROM jobs WHERE "JobID" = ? AND "Submit" IS ? '
+            'AND ("Start" IS NULL OR "Start" NOT GLOB \'[0-9]*\')',
+            started.itertuples(index=False, name=None))
+
+        placeholders = ', '.join('?' for _ in sacct_fields)
+        self._conn.executemany(f'INSERT OR REPLACE INTO jobs VALUES ({placeholders})',
+                               records.itertuples(index=False, name=None))
+        self._conn.commit()
+        return len(records)
+
+    def records(self, d_from, d_to=''):
+        """Raw records in the same form as _get_slurm_records.
+
+        Selects jobs in any state after d_from, like sacct --start, and
+        optionally submitted before d_to.
+        """
+
+        query = 'SELECT * FROM jobs WHERE ("End" >= ? OR "End" IS NULL OR "End" NOT GLOB \'[0-9]*\')'
+        params = [f'{pd.to_datetime(d_from):%Y-%m-%dT%H:%M:%S}']
+        if d_to != '':
+            query += ' AND "Submit" <= ?'
+            params.append(f'{pd.to_datetime(d_to):%Y-%m-%dT%H:%M:%S}')
+
+        records = pd.read_sql_query(query, self._conn, params=params)
+        return pd.DataFrame() if records.empty else records
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,186 @@
+from io import StringIO
+import subprocess
+import warnings
+import numpy as np
+import pandas as pd
+from viewclust.tres import _size_scale
+from viewclust.slurm.sacct_jobs import _check_sacct
+from viewclust.slurm.sacct_time import parse_sacct_times
+
+# Fields requested from sacct for memory efficiency, steps included
+mem_fields = ['JobID', 'User', 'Account', 'Submit', 'Start', 'State',
+              'NCPUS', 'NNodes', 'ReqMem', 'MaxRSS']
+
+
+def sacct_mem_records(d_from, account='', sacct_file=''):
+    """Raw sacct records of jobs and their steps for mem_efficiency.
+
+    Parameters
+    -------
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    account: str, optional
+        Account to query, e.g. 'def-tk11br_cpu'. If empty, every account.
+    sacct_file: str, optional
+        Reads a raw dump with the mem_fields columns instead of querying
+        sacct. Defaults to the empty string.
+
+    Returns
+    -------
+    DataFrame
+        One row per allocation and per step, as printed by sacct.
+
+    Raises
+    -------
+    RuntimeError
+        If sacct exits with an error.
+    """
+
+    if sacct_file != '':
+        source = sacct_file
+    else:
+        command = ['sacct', '--allusers', '--parsable2', '--delimiter=;',
+                   '--starttime', f'{pd.to_datetime(d_from):%Y-%m-%dT%H:%M:%S}',
+                   f'--format={",".join(mem_fields)}']
+        if account != '':
+            command += ['--accounts', account]
+        process = subprocess.run(command, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        _check_sacct(process.returncode, process.stderr)
+        source = StringIO(process.stdout.decode('UTF-8'))
+    try:
+        return pd.read_csv(source, sep=';', dtype='str', on_bad_lines='skip')
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame(columns=mem_fields)
+
+
+def parse_mem(values):
+    """Memory sizes such as '3500K', '12.5M' or '16G' in MB.
+
+    A trailing per core 'c' or per node 'n' flag is ignored, see
+    parse_req_mem. Values without a unit are taken as MB.
+    """
+
+    values = pd.Series(values, dtype=object).str.strip().str.rstrip('cn')
+    unit = values.str[-1:].str.upper()
+    scale = unit.map(_size_scale)
+    numbers = pd.to_numeric(values.where(scale.isna(), values.str[:-1]),
+                            errors='coerce')
+    return numbers * scale.fillna(1)
+
+
+def parse_req_mem(req_mem, ncpus, nnodes):
+    """Total requested memory in MB from sacct ReqMem.
+
+    '4000Mc' is per core and scaled by ncpus. '16Gn', and '16G' as printed
+    by recent slurm versions, are per node and scaled by nnodes.
+    """
+
+    req_mem = pd.Series(req_mem, dtype=object)
+    per_core = req_mem.str.strip().str.endswith('c').fillna(False).to_numpy()
+    # Nullable integer counts, as from sacct_jobs, would give objects
+    count = np.where(per_core,
+                     pd.to_numeric(ncpus, errors='coerce').astype('float64'),
+                     pd.to_numeric(nnodes, errors='coerce').astype('float64'))
+    return parse_mem(req_mem) * count
+
+
+def mem_efficiency(records, steps=None):
+    """Memory efficiency of jobs, users and accounts.
+
+    Parameters
+    -------
+    records: DataFrame
+        Job allocations, either from sacct_jobs, the records of a JobStore
+        or sacct_mem_records. Rows of steps, e.g. '1234.batch', are used
+        as the steps of their allocation. sacct_jobs and JobStore query
+        allocations only, so their records need steps, and give empty
+        tables with a warning without them.
+    steps: DataFrame, optional
+        Step records with JobID and MaxRSS columns, e.g. from
+        sacct_mem_records, for allocations queried without steps.
+
+    Returns
+    -------
+    jobs:
+        Frame by job with user, account, submit, start, req_mem and
+        max_rss (in MB) and efficiency, the ratio of max_rss to req_mem.
+        max_rss is the largest MaxRSS of any step of the job.
+    users, accounts:
+        Frames by user and by account with the number of jobs, summed
+        req_mem and max_rss, their ratio as efficiency and the median
+        job efficiency.
+    """
+
+    records = records.rename(columns=str.lower)
+    if steps is not None:
+        records = pd.concat([records, steps.rename(columns=str.lower)],
+                            ignore_index=True)
+
+    jobid = records['jobid'].astype(str)
+    parent = jobid.str.split('.', n=1).str[0]
+    is_step = jobid.str.contains('.', regex=False).to_numpy()
+
+    allocations = records.loc[~is_step]
+    allocations = allocations.drop_duplicates(subset='jobid', keep='last')
+    ncpus = allocations['ncpus'] if 'ncpus' in allocations else allocations['reqcpus']
+    jobs = pd.DataFrame({
+        'user': allocations['user'].to_numpy(),
+        'account': allocations['account'].to_numpy(),
+        'submit': _times(allocations['submit']),
+        'start': _times(allocations['start']),
+        'req_mem': parse_req_mem(allocations['reqmem'], ncpus,
+                                 allocations['nnodes']).to_numpy(),
+    }, index=pd.Index(allocations['jobid'].astype(str).to_numpy(), name='jobid'))
+
+    if steps is None and not is_step.any() and jobs['start'].notna().any():
+        warnings.warn('There are no job steps in the records, pass steps, '
+                      'e.g. from sacct_mem_records, for their MaxRSS')
+
+    # sacct_jobs does not query MaxRSS
+    maxrss = records['maxrss'] if 'maxrss' in records else pd.Series(
+        np.nan, index=records.index, dtype=object)
+    rss = parse_mem(maxrss[is_step]).groupby(
+        parent[is_step].to_numpy()).max()
+    jobs['max_rss'] = rss.reindex(jobs.index).to_numpy(dtype='float64')
+    jobs = jobs[jobs['max_rss'].notna() & (jobs['req_mem'] > 0)]
+    jobs['efficiency'] = jobs['max_rss'] / jobs['req_mem']
+
+    return jobs, _summary(jobs, 'user'), _summary(jobs, 'account')
+
+
+def mem_plot_arrays(jobs):
+    """Line segments from requested to used memory of every job, in GB.
+
+    Returns
+    -------
+    x, y: ndarray
+        Three points per job, (submit, req_mem), (start, max_rss) and a
+        gap, ready for a single plotly Scatter trace.
+    """
+
+    n = len(jobs)
+    x = np.empty((n, 3), dtype=object)
+    x[:, 0] = jobs['submit'].to_numpy()
+    x[:, 1] = jobs['start'].to_numpy()
+    x[:, 2] = None
+    y = np.empty((n, 3), dtype=object)
+    y[:, 0] = jobs['req_mem'].to_numpy() / 1000
+    y[:, 1] = jobs['max_rss'].to_numpy() / 1000
+    y[:, 2] = None
+    return x.ravel(), y.ravel()
+
+
+def _times(values):
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.to_numpy()
+    return parse_sacct_times(values).to_numpy()
+
+
+def _summary(jobs, by):
+    grouped = jobs.groupby(by, observed=True)
+    summary = grouped[['req_mem', 'max_rss']].sum()
+    summary.insert(0, 'jobs', grouped.size())
+    summary['efficiency'] = summary['max_rss'] / summary['req_mem']
+    summary['median_efficiency'] = grouped['efficiency'].median()
+    return summary
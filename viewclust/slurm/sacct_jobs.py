@@ -1,7 +1,14 @@
+from contextlib import nullcontext
 from io import StringIO
 import subprocess
+import tempfile
 import pandas as pd
 import os
+from viewclust.profiling import stage, profile, print_stage
+from viewclust.serialize import serialize
+from viewclust.tres import parse_tres, tres_separator
+from viewclust.slurm.sacct_time import parse_sacct_times, parse_sacct_durations
+from viewclust.slurm.compact_jobs import compact_jobs, memory_report
 
 # Time columns in job records
 # If we exclude PENDING jobs (that we do in slurm_raw_processing), all time columns should have a time stamp,
@@ -11,9 +18,17 @@ time_columns = ['Eligible','Submit','Start','End']
 # Define what constitutes a duplicate job
 duplicate_job_def = ['JobID','Submit','Start']
 
+# Fields requested from sacct, in order
+sacct_fields = ['Account', 'AllocCPUS', 'AllocNodes', 'AllocTRES', 'AssocID', 'Cluster', 'CPUTimeRAW',
+    'CPUTime', 'DerivedExitCode', 'ElapsedRaw', 'Elapsed', 'Eligible', 'End', 'ExitCode', 'Flags', 'GID', 'Group',
+    'JobID', 'JobIDRaw', 'NCPUS', 'NNodes', 'NodeList', 'Priority', 'Partition', 'QOS', 'QOSRAW', 'Reason', 'ReqCPUS',
+    'ReqMem', 'ReqNodes', 'ReqTRES', 'Reserved', 'ResvCPURAW', 'ResvCPU', 'Start', 'State', 'Submit', 'Suspended',
+    'SystemCPU', 'TimelimitRaw', 'Timelimit', 'TotalCPU', 'UID', 'User', 'UserCPU', 'WorkDir']
+
 
 def sacct_jobs(account_query, d_from, d_to='', debugging=False,
-               serialize_frame='', slurm_names=False):
+               serialize_frame='', slurm_names=False, job_store='', compact=False,
+               shard='', clusters=None):
     """Ingest job record information from slurm via sacct and return DataFrame.
 
     Parameters
@@ -23,131 +38,295 @@ def sacct_jobs(account_query, d_from, d_to='', debugging=False,
     d_from: date str
         Beginning of the query period, e.g. '2019-04-01T00:00:00
     debugging: boolean, optional
-        Boolean for reporting progress to stdout. Default False.
+        Boolean for reporting progress to stdout. Prints the time, rows and
+        peak memory of every stage, see viewclust.profiling. Default False.
     sacct_file: str, optional
         Loads a raw query from file.
         If empty, query is rerun. Defaults to the empty string.
     serialize_frame: str, optional
-        Pickle the resulting DataFrame.
-        If empty, pickling is skipped. Defaults to the empty string.
+        Serialize the resulting DataFrame. The format is inferred from
+        the extension, e.g. '.parquet' or '.feather', and is a pickle
+        otherwise. See viewclust.serialize.
+        If empty, serialization is skipped. Defaults to the empty string.
     slurm_names: str, optional
         Keep slurm's sacct column names instead of shorthands.
         Defaults to False.
+    job_store: str or JobStore, optional
+        Local job store to serve the query from. The store is refreshed
+        with records changed since its last pull before being read.
+        If empty, sacct is queried for the whole period.
+        Defaults to the empty string.
+    compact: bool, optional
+        Return categoricals and the smallest integer dtypes, and drop
+        columns no viewclust function reads. See compact_jobs.
+        With debugging, a memory usage report is printed.
+        Defaults to False.
+    shard: pandas timedelta str, optional
+        Split the query into shards of this length, e.g. '1D' or '7D',
+        that are queried concurrently. See sharded_sacct_records.
+        If empty, a single sacct query is run. Defaults to the empty string.
+    clusters: list of str, optional
+        Clusters to query separately with sacct -M, concurrently and in
+        shards if shard is given. Cannot be combined with job_store.
+        Defaults to None.
 
     Returns
     -------
     DataFrame
         Returns a standard pandas DataFrame, or an empty dataframe if no
         jobs are found.
+
+    Raises
+    -------
+    RuntimeError
+        If sacct exits with an error.
     """
 
-    raw_frame = _get_slurm_records(pd.to_datetime(d_from))
-    out_frame = _slurm_raw_processing(raw_frame, slurm_names)
+    with profile(print_stage) if debugging else nullcontext(), \
+            stage('sacct_jobs') as timed:
+        with stage('sacct_jobs.query') as query:
+            if job_store != '' and clusters:
+                raise ValueError('clusters cannot be queried through a job_store')
+            if job_store != '':
+                # Imported here as the store itself builds on this module
+                from viewclust.slurm.job_store import JobStore
+                if not isinstance(job_store, JobStore):
+                    job_store = JobStore(job_store)
+                job_store.refresh(d_from)
+                raw_frame = job_store.records(d_from)
+            elif shard != '' or clusters:
+                # Imported here as the sharded fetcher builds on this module
+                from viewclust.slurm.sacct_shards import sharded_sacct_records
+                raw_frame = sharded_sacct_records(d_from, shard=shard, clusters=clusters)
+            else:
+                raw_frame = _get_slurm_records(pd.to_datetime(d_from))
+            query.rows_out = len(raw_frame)
+        if raw_frame.empty:
+            return raw_frame
+
+        out_frame = _slurm_raw_processing(raw_frame, slurm_names)
+
+        # Legacy/consistency check:
+        # Protect end time for jobs that are still currently running
+        out_frame['end'] = out_frame['end'].replace({pd.NaT: pd.to_datetime(d_to)})
+
+        if compact:
+            with stage('sacct_jobs.compact', rows_in=len(out_frame)) as compacting:
+                full_frame = out_frame
+                out_frame = compact_jobs(full_frame)
+                compacting.rows_out = len(out_frame)
+            if debugging:
+                print(memory_report(full_frame, out_frame))
+
+        # return _slurm_consistency_check(out_frame) if debugging else out_frame
+        if serialize_frame != '':
+            serialize(out_frame, serialize_frame)
+        timed.rows_out = len(out_frame)
+    return out_frame
 
-    # Legacy/consistency check:
-    # Protect end time for jobs that are still currently running
-    out_frame['end'] = out_frame['end'].replace({pd.NaT: pd.to_datetime(d_to)})
 
-    # return _slurm_consistency_check(out_frame) if debugging else out_frame
-    # TODO: consisder swapping this to a better format
-    if serialize_frame != '':
-        out_frame.to_pickle(serialize_frame, protocol=4)
-    return out_frame
+def sacct_chunks(d_from, d_to='', chunksize=100000, sacct_file='',
+                 slurm_names=False):
+    """Stream job record information from slurm via sacct in chunks.
 
+    The sacct output (or a dump file) is parsed while it is being read, so
+    peak memory is bounded by the chunk size rather than the full query.
+    Fully identical records are only dropped within a chunk.
 
-def _get_slurm_records(arg, ssh_client=None):
-    '''Retrieve records either via SSH or from a file.'''
+    Parameters
+    -------
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00
+    d_to: date str, optional
+        End time given to jobs that are still running. See sacct_jobs.
+    chunksize: int, optional
+        Number of records per yielded frame. Defaults to 100000.
+    sacct_file: str, optional
+        Reads a raw sacct dump from file instead of querying sacct.
+        Defaults to the empty string.
+    slurm_names: str, optional
+        Keep slurm's sacct column names instead of shorthands.
+        Defaults to False.
+
+    Yields
+    -------
+    DataFrame
+        Processed job records, in the same format as sacct_jobs.
+
+    Raises
+    -------
+    RuntimeError
+        If sacct exits with an error, once its output has been read.
+    """
+
+    source = sacct_file if sacct_file != '' else pd.to_datetime(d_from)
+    end_column = 'End' if slurm_names else 'end'
+    for records in _iter_slurm_records(source, chunksize):
+        out_frame = _slurm_raw_processing(records, slurm_names)
+        out_frame[end_column] = out_frame[end_column].replace({pd.NaT: pd.to_datetime(d_to)})
+        yield out_frame
+
+
+def _sacct_command(arg):
+    '''Build the sacct command for a list of jobs or a start time.'''
 
-    sacct_format = 'Account,AllocCPUS,AllocNodes,AllocTRES,AssocID,Cluster,CPUTimeRAW,'\
-    'CPUTime,DerivedExitCode,ElapsedRaw,Elapsed,Eligible,End,ExitCode,Flags,GID,Group,'\
-    'JobID,JobIDRaw,NCPUS,NNodes,NodeList,Priority,Partition,QOS,QOSRAW,Reason,ReqCPUS,'\
-    'ReqMem,ReqNodes,ReqTRES,Reserved,ResvCPURAW,ResvCPU,Start,State,Submit,Suspended,'\
-    'SystemCPU,TimelimitRaw,Timelimit,TotalCPU,UID,User,UserCPU,WorkDir'
+    sacct_format = ','.join(sacct_fields)
     sacct_command = 'TZ=UTC sacct'
     sacct_options = f'--duplicates --allusers --allocations --parsable2 --delimiter=";" --format={sacct_format}'
 
+    if isinstance(arg, list) and arg:
+        # Get specific jobs
+        return f'{sacct_command} {sacct_options} --jobs {",".join(arg)}'
+    elif isinstance(arg, pd.Timestamp):
+        # Get a list of jobs in a date range
+        # Note that --start selects jobs in ANY state after the specified time.
+        # This is not the same as filtering by 'Start' afterwards.
+        return f'{sacct_command} {sacct_options} --start {arg:%Y-%m-%dT%H:%M} --end Now\n'
+
+    print('Unexpected input parameter to get_slurm_records().')
+    return None
+
+
+def _get_slurm_records(arg, ssh_client=None):
+    '''Retrieve records either via SSH or from a file.'''
+
     if isinstance(arg, str):
         # Read a SLURM dump from a file
         source = arg
-        command = None
         if not os.path.isfile(source):
             print('The seed file does not exist. Quitting.')
             return pd.DataFrame()
-    elif isinstance(arg, list) and arg:
-        # Get specific jobs
-        command = f'{sacct_command} {sacct_options} --jobs {",".join(arg)}'
-    elif isinstance(arg, pd.Timestamp):
-        # Get a list of jobs in a date range
-        # Note that --start selects jobs in ANY state after the specified time.
-        # This is not the same as filtering by 'Start' afterwards.
-        command = f'{sacct_command} {sacct_options} --start {arg:%Y-%m-%dT%H:%M} --end Now\n'
     else:
-        print('Unexpected input parameter to get_slurm_records().')
-        return pd.DataFrame()
-
-    if command:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-        stdout, stderr = process.communicate()
-        source = stdout.decode('UTF-8')
+        command = _sacct_command(arg)
+        if command is None:
+            return pd.DataFrame()
+        with stage('sacct.subprocess'):
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
+            stdout, stderr = process.communicate()
+            _check_sacct(process.returncode, stderr)
+            source = StringIO(stdout.decode('UTF-8'))
 
     try:
-        records = pd.read_csv(StringIO(source), sep=';', dtype='str', on_bad_lines='skip')
-    except e:  # TODO: Fix this to be less heavy handed
+        with stage('sacct.read_csv') as timed:
+            records = pd.read_csv(source, sep=';', dtype='str', on_bad_lines='skip')
+            timed.rows_out = len(records)
+    except pd.errors.EmptyDataError:
         return pd.DataFrame()
 
     return pd.DataFrame() if records.empty else records
 
 
-def _slurm_raw_processing(records, slurm_names):
+def _iter_slurm_records(arg, chunksize=100000):
+    '''Retrieve records in chunks while sacct or a file is being read.'''
 
-    check = records.duplicated( keep=False )
-    if check.any():
-        duplicated_records = records.loc[ check, 'JobID'].unique().tolist()
-        len1 = len(records)
-        records.drop_duplicates( keep='last', inplace=True, ignore_index=True )
-        len2 = len(records)
-        print(f'Dropped {len1-len2} fully identical records.')
-
-    # Convert date/times columns from 'str' to the 'datetime' type.
-    # Invalid parsing will be set to NaN.
-    records[time_columns] = records[time_columns].apply( pd.to_datetime, errors='coerce' )
-
-    # Convert integer columns from 'str' to 'int64'
-    # Invalid parsing will be set to NaN and then to 0
-    columns_int = ['AllocCPUS', 'AllocNodes', 'AssocID', 'CPUTimeRAW', 'ElapsedRaw', 'GID', 'JobIDRaw',
-    'NCPUS', 'NNodes', 'Priority', 'QOSRAW', 'ReqCPUS', 'ReqNodes', 'ResvCPURAW', 'TimelimitRaw', 'UID']
-    records[columns_int] = records[columns_int].apply( pd.to_numeric, errors='coerce' ).fillna(0).astype('Int64')
-
-    # Replace unnecessary columns
-    records['Timelimit'] = records['TimelimitRaw']
-    records['CPUTime'] = records['CPUTimeRAW']
-    records['Elapsed'] = records['ElapsedRaw']
-    records['ResvCPU'] = records['ResvCPURAW']
-    records.drop( columns=['TimelimitRaw','CPUTimeRAW','ElapsedRaw','ResvCPURAW'], inplace=True )
-
-    # Allocated memory per job. Note that memory can be specified as a float in the submission script,
-    # therefore we preserve this type for multiplication, but then cast to integer.
-    records[['Mem','_mem_unit']] = records['AllocTRES'].str.extract('mem=([0-9.]+)(M|G|T)')
-    records['Mem'] = pd.to_numeric( records['Mem'], errors='coerce').fillna(0).astype('float64')
-    records['Mem'].mask( records['_mem_unit']=='G', records['Mem']*1024, inplace=True )
-    records['Mem'].mask( records['_mem_unit']=='T', records['Mem']*1024*1024, inplace=True )
-    records['Mem'] = records['Mem'].round(0).astype('Int64')
-    records['MemTime'] = records['Mem']*records['Elapsed']
-    records.drop( columns=['_mem_unit'], inplace=True )
-
-    # GPUs: Get a number of allocated GPUs and GPU-seconds
-    records['NGPUS'] = records['AllocTRES'].str.extract('gpu=(\d+)',expand=False)
-    records['NGPUS'] = pd.to_numeric( records['NGPUS'], errors='coerce' ).fillna(0).astype('Int64')
-    records['GPUTime'] = records['NGPUS']*records['Elapsed']
-
-    if not slurm_names:
-        old_fields = ['jobid', 'user', 'account', 'submit', 'start', 'end', 'ncpus', 'nnodes',
-        'reqmem', 'timelimit', 'state', 'reqtres', 'reqtres', 'priority',
-        'partition', 'reqcpus', 'mem', 'ngpus', 'alloctres']
-
-        records.columns = records.columns.str.lower()
-        records = records.drop(records.columns.difference(old_fields), 1)
+    process = None
+    if isinstance(arg, str):
+        source = arg
+        if not os.path.isfile(source):
+            print('The seed file does not exist. Quitting.')
+            return
+    else:
+        command = _sacct_command(arg)
+        if command is None:
+            return
+        # stderr goes to a file so a chatty sacct cannot block on a full pipe
+        errors = tempfile.TemporaryFile()
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors, shell=True)
+        source = process.stdout
+
+    try:
+        reader = pd.read_csv(source, sep=';', dtype='str', on_bad_lines='skip',
+                             chunksize=chunksize, encoding='UTF-8')
+        for records in reader:
+            if not records.empty:
+                yield records
+    except pd.errors.EmptyDataError:
+        pass
+    finally:
+        if process is not None:
+            process.stdout.close()
+            process.wait()
+
+    # Only reached once the output is exhausted, not when the caller stops
+    if process is not None:
+        errors.seek(0)
+        stderr = errors.read()
+        errors.close()
+        _check_sacct(process.returncode, stderr)
+
+
+def _check_sacct(returncode, stderr):
+    '''Raise if sacct failed, instead of returning its partial output.'''
+
+    if returncode != 0:
+        raise RuntimeError(f'sacct failed with exit status {returncode}: '
+                           f'{stderr.decode("UTF-8", "replace").strip()}')
+
+
+def _slurm_raw_processing(records, slurm_names):
 
+    with stage('sacct.processing', rows_in=len(records)) as timed:
+        with stage('sacct.dedupe', rows_in=len(records)) as dedupe:
+            check = records.duplicated( keep=False )
+            if check.any():
+                duplicated_records = records.loc[ check, 'JobID'].unique().tolist()
+                len1 = len(records)
+                records.drop_duplicates( keep='last', inplace=True, ignore_index=True )
+                len2 = len(records)
+                print(f'Dropped {len1-len2} fully identical records.')
+            dedupe.rows_out = len(records)
+
+        # Convert date/times columns from 'str' to the 'datetime' type with sacct's fixed layout.
+        # Sentinels like 'Unknown' and invalid parsing will be set to NaT.
+        with stage('sacct.times', rows_in=len(records)):
+            records[time_columns] = records[time_columns].apply( parse_sacct_times )
+
+        # Convert integer columns from 'str' to 'int64'
+        # Invalid parsing will be set to NaN and then to 0
+        with stage('sacct.integers', rows_in=len(records)):
+            columns_int = ['AllocCPUS', 'AllocNodes', 'AssocID', 'CPUTimeRAW', 'ElapsedRaw', 'GID', 'JobIDRaw',
+            'NCPUS', 'NNodes', 'Priority', 'QOSRAW', 'ReqCPUS', 'ReqNodes', 'ResvCPURAW', 'TimelimitRaw', 'UID']
+            records[columns_int] = records[columns_int].apply( pd.to_numeric, errors='coerce' ).fillna(0).astype('Int64')
+
+        # Replace unnecessary columns. Timelimit is decoded into a timedelta, 'UNLIMITED' and
+        # 'Partition_Limit' become NaT.
+        with stage('sacct.durations', rows_in=len(records)):
+            records['Timelimit'] = parse_sacct_durations(records['Timelimit'])
+            records['CPUTime'] = records['CPUTimeRAW']
+            records['Elapsed'] = records['ElapsedRaw']
+            records['ResvCPU'] = records['ResvCPURAW']
+            records.drop( columns=['TimelimitRaw','CPUTimeRAW','ElapsedRaw','ResvCPURAW'], inplace=True )
+
+        # Parse requested and allocated TRES once into numeric columns, e.g. ReqTRES_cpu, ReqTRES_mem (in MB),
+        # ReqTRES_billing, ReqTRES_gres/gpu or ReqTRES_gres/gpu:v100, so nothing downstream parses the strings again.
+        with stage('sacct.tres', rows_in=len(records)):
+            req_tres = parse_tres(records['ReqTRES']).add_prefix(f'ReqTRES{tres_separator}')
+            alloc_tres = parse_tres(records['AllocTRES']).add_prefix(f'AllocTRES{tres_separator}')
+            records = pd.concat([records, req_tres, alloc_tres], axis=1)
+
+        with stage('sacct.usage', rows_in=len(records)):
+            # Allocated memory per job. Note that memory can be specified as a float in the submission script,
+            # therefore we preserve this type for multiplication, but then cast to integer.
+            records['Mem'] = records.get(f'AllocTRES{tres_separator}mem', pd.Series(0.0, index=records.index))
+            records['Mem'] = records['Mem'].round(0).astype('Int64')
+            records['MemTime'] = records['Mem']*records['Elapsed']
+
+            # GPUs: Get a number of allocated GPUs and GPU-seconds
+            records['NGPUS'] = records.get(f'AllocTRES{tres_separator}gres/gpu', pd.Series(0.0, index=records.index))
+            records['NGPUS'] = records['NGPUS'].round(0).astype('Int64')
+            records['GPUTime'] = records['NGPUS']*records['Elapsed']
+
+        if not slurm_names:
+            old_fields = ['jobid', 'user', 'account', 'submit', 'start', 'end', 'ncpus', 'nnodes',
+            'reqmem', 'timelimit', 'state', 'reqtres', 'reqtres', 'priority',
+            'partition', 'reqcpus', 'mem', 'ngpus', 'alloctres', 'eligible', 'qos']
+
+            records.columns = records.columns.str.lower()
+            tres_fields = records.columns[records.columns.str.startswith(('reqtres' + tres_separator,
+                                                                          'alloctres' + tres_separator))]
+            records = records.drop(columns=records.columns.difference(old_fields + list(tres_fields)))
+
+        timed.rows_out = len(records)
     return records
 
 def _slurm_consistency_check( records ):
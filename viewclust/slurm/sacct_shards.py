@@ -0,0 +1,142 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import os
+import pandas as pd
+from viewclust.slurm.sacct_jobs import sacct_fields, duplicate_job_def
+
+
+def sharded_sacct_records(d_from, d_to='', shard='7D', clusters=None,
+                          max_concurrency=4, retries=2, backoff=1.0):
+    """Raw sacct records of a long window, queried as concurrent shards.
+
+    The window is split into shards of the given length, and optionally
+    per cluster, which are queried with sacct at most max_concurrency at a
+    time. A job running across several shards is returned by each of them,
+    so records are merged and deduplicated on duplicate_job_def, plus the
+    cluster when clusters are given.
+
+    Parameters
+    -------
+    d_from: date str
+        Beginning of the query period, e.g. '2019-04-01T00:00:00'.
+    d_to: date str, optional
+        End of the query period. If empty, the last shard ends now.
+    shard: pandas timedelta str, optional
+        Length of every shard, e.g. '1D' or '7D'. If empty, the whole
+        window is a single shard, e.g. to only split it by cluster.
+        Defaults to '7D'.
+    clusters: list of str, optional
+        Clusters to query separately with sacct -M. If None, only the
+        local cluster is queried.
+    max_concurrency: int, optional
+        Maximum number of sacct processes at a time. Defaults to 4.
+    retries: int, optional
+        Number of times a failed shard is queried again. Defaults to 2.
+    backoff: float, optional
+        Seconds waited before the first retry, doubled for every further
+        retry. Defaults to 1.0.
+
+    Returns
+    -------
+    DataFrame
+        Raw records in the same form as sacct prints them, or an empty
+        frame if there are none.
+
+    Raises
+    -------
+    RuntimeError
+        If a shard still fails after every retry.
+    """
+
+    coroutine = sharded_sacct_records_async(d_from, d_to, shard, clusters,
+                                            max_concurrency, retries, backoff)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    # Already inside an event loop, e.g. in a notebook
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+async def sharded_sacct_records_async(d_from, d_to='', shard='7D', clusters=None,
+                                      max_concurrency=4, retries=2, backoff=1.0):
+    """Coroutine version of sharded_sacct_records."""
+
+    bounds = shard_bounds(d_from, d_to, shard)
+    queries = [(start, end, cluster) for cluster in (clusters or [None])
+               for start, end in bounds]
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results = await asyncio.gather(*[
+        _query_shard(semaphore, _shard_args(*query), retries, backoff)
+        for query in queries])
+
+    records = [result for result in results if not result.empty]
+    if not records:
+        return pd.DataFrame()
+    key = duplicate_job_def + (['Cluster'] if clusters else [])
+    records = pd.concat(records, ignore_index=True)
+    return records.drop_duplicates(subset=key, keep='last', ignore_index=True)
+
+
+def shard_bounds(d_from, d_to='', shard='7D'):
+    """(start, end) strings of consecutive shards covering the window.
+
+    The end of the last shard is 'Now' if d_to is empty. An empty shard
+    length gives a single shard.
+    """
+
+    d_from = pd.to_datetime(d_from)
+    if d_to == '':
+        last = pd.Timestamp.utcnow().tz_localize(None)
+    else:
+        last = pd.to_datetime(d_to)
+
+    starts = [d_from]
+    if shard != '':
+        length = pd.Timedelta(shard)
+        while starts[-1] + length < last:
+            starts.append(starts[-1] + length)
+    ends = [f'{start:%Y-%m-%dT%H:%M:%S}' for start in starts[1:]]
+    ends.append('Now' if d_to == '' else f'{last:%Y-%m-%dT%H:%M:%S}')
+    return [(f'{start:%Y-%m-%dT%H:%M:%S}', end) for start, end in zip(starts, ends)]
+
+
+def _shard_args(start, end, cluster=None):
+    args = ['sacct', '--duplicates', '--allusers', '--allocations', '--parsable2',
+            '--delimiter=;', f'--format={",".join(sacct_fields)}',
+            '--start', start, '--end', end]
+    if cluster is not None:
+        args += ['-M', cluster]
+    return args
+
+
+async def _query_shard(semaphore, args, retries, backoff):
+    """Run one sacct query, retrying failures with exponential backoff."""
+
+    env = dict(os.environ, TZ='UTC')
+    for attempt in range(retries + 1):
+        async with semaphore:
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *args, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE, env=env)
+                stdout, stderr = await process.communicate()
+                failed = process.returncode != 0
+            except OSError as error:
+                stdout, stderr, failed = b'', str(error).encode(), True
+
+        if not failed:
+            try:
+                return pd.read_csv(StringIO(stdout.decode('UTF-8')), sep=';',
+                                   dtype='str', on_bad_lines='skip')
+            except pd.errors.EmptyDataError:
+                return pd.DataFrame()
+        if attempt < retries:
+            await asyncio.sleep(backoff * 2 ** attempt)
+
+    raise RuntimeError(f'sacct failed after {retries + 1} attempts '
+                       f'({" ".join(args[7:])}): {stderr.decode("UTF-8").strip()}')
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+# Layout of every timestamp printed by sacct
+sacct_time_format = '%Y-%m-%dT%H:%M:%S'
+
+# Values sacct prints instead of a timestamp or a duration
+time_sentinels = ['Unknown', 'None', 'N/A', 'INVALID', '']
+duration_sentinels = ['UNLIMITED', 'Partition_Limit', 'INVALID', 'None', '']
+
+
+def parse_sacct_times(values):
+    """Decode sacct timestamps, e.g. Submit, Start, End or Eligible.
+
+    Parameters
+    -------
+    values: Series of str
+        Timestamps in sacct's '%Y-%m-%dT%H:%M:%S' layout. Sentinels such
+        as 'Unknown' or 'None' and missing values become NaT.
+
+    Returns
+    -------
+    Series of datetime64[ns]
+    """
+
+    values = pd.Series(values)
+    known = values.notna() & ~values.isin(time_sentinels)
+    stamps = values.where(known, 'NaT').to_numpy(dtype=str)
+    try:
+        # numpy decodes the fixed ISO layout directly
+        parsed = stamps.astype('M8[s]').astype('M8[ns]')
+    except ValueError:
+        parsed = pd.to_datetime(values.where(known), format=sacct_time_format,
+                                errors='coerce').to_numpy()
+    return pd.Series(parsed, index=values.index, name=values.name)
+
+
+def parse_sacct_durations(values):
+    """Decode sacct durations, e.g. Timelimit, Elapsed or TotalCPU.
+
+    Parameters
+    -------
+    values: Series of str
+        Durations as [D-][HH:]MM:SS[.fff]. Sentinels such as 'UNLIMITED'
+        or 'Partition_Limit' and missing values become NaT.
+
+    Returns
+    -------
+    Series of timedelta64[ns]
+    """
+
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values.where(~values.isin(duration_sentinels)))
+
+    # Durations repeat a lot, so only every distinct value is decoded
+    parts = pd.Series(uniques, dtype=object).str.extract(r'^(?:(\d+)-)?(.*)$')
+    days = pd.to_numeric(parts[0], errors='coerce').fillna(0)
+    clock = parts[1]
+    # MM:SS is printed for durations under an hour
+    clock = clock.where(clock.str.count(':') != 1, '00:' + clock)
+    decoded = (pd.to_timedelta(clock, errors='coerce')
+               + pd.to_timedelta(days, unit='D'))
+
+    decoded = np.r_[decoded.to_numpy(), np.timedelta64('NaT', 'ns')]
+    durations = decoded.take(codes)
+    return pd.Series(durations, index=values.index, name=values.name,
+                     dtype='timedelta64[ns]')
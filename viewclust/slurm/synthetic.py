@@ -0,0 +1,324 @@
+import inspect
+import numpy as np
+import pandas as pd
+from viewclust.slurm.sacct_jobs import sacct_fields
+
+# Requested cores of CPU jobs and their relative frequency
+_cpu_choices = [1, 2, 4, 8, 16, 32, 48, 64, 96, 192]
+_cpu_weights = [30, 8, 12, 10, 8, 8, 10, 4, 6, 4]
+
+# Memory per core in MB
+_mem_choices = [256, 1000, 2000, 4000, 8000]
+_mem_weights = [10, 30, 30, 20, 10]
+
+# Time limits in minutes
+_limit_choices = [15, 60, 180, 720, 1440, 4320, 10080]
+_limit_weights = [10, 25, 20, 20, 15, 7, 3]
+
+# Upper time limit in minutes of every partition tier, b1 to b5
+_tiers = [180, 720, 1440, 4320, 10080]
+
+_cores_per_node = 48
+
+
+def synthetic_sacct_records(n_jobs, d_from='2020-01-01T00:00:00',
+                            d_to='2020-02-01T00:00:00', seed=0, users=200,
+                            accounts=40, gpu_fraction=0.15, array_fraction=0.3,
+                            pending_fraction=0.05, running_fraction=0.05,
+                            cluster='synthetic', chunksize=1000000):
+    """Seeded synthetic raw sacct records.
+
+    Records are in the exact form returned by reading a sacct dump, i.e.
+    one string column per sacct_fields with missing values for empty
+    fields, and can be processed like real records. Jobs are submitted
+    uniformly over the window by users of heavy tailed activity, and
+    include array jobs, GPU jobs, pending and running jobs as of d_to,
+    timeouts, failures and cancellations.
+
+    Parameters
+    -------
+    n_jobs: int
+        Number of job allocations.
+    d_from, d_to: date str, optional
+        Submit window. Pending and running jobs are current as of d_to.
+    seed: int, optional
+        Seed of the generator. The same arguments always give the same
+        records. Defaults to 0.
+    users, accounts: int, optional
+        Number of distinct users and accounts. Defaults to 200 and 40.
+    gpu_fraction: float, optional
+        Fraction of submissions requesting GPUs. Defaults to 0.15.
+    array_fraction: float, optional
+        Fraction of jobs that are array tasks. Defaults to 0.3.
+    pending_fraction, running_fraction: float, optional
+        Fraction of jobs pending and running as of d_to.
+        Default to 0.05 each.
+    cluster: str, optional
+        Cluster name of every record. Defaults to 'synthetic'.
+    chunksize: int, optional
+        Jobs generated at a time. See write_sacct_dump.
+        Defaults to 1000000.
+
+    Returns
+    -------
+    DataFrame
+
+    See Also
+    -------
+    write_sacct_dump: Writes the same records as a sacct dump file.
+    """
+
+    chunks = list(_chunks(n_jobs, d_from, d_to, seed, users, accounts,
+                          gpu_fraction, array_fraction, pending_fraction,
+                          running_fraction, cluster, chunksize))
+    if not chunks:
+        return pd.DataFrame(columns=sacct_fields, dtype=object)
+    records = pd.concat(chunks, ignore_index=True)
+    return records.replace('', np.nan)
+
+
+def write_sacct_dump(path, n_jobs, chunksize=1000000, **kwargs):
+    """Write synthetic_sacct_records to a sacct dump file.
+
+    The records are generated and written chunksize jobs at a time, so
+    dumps of tens of millions of jobs fit in memory. The file can be read
+    with sacct_chunks(sacct_file=path) or used as a JobStore seed.
+
+    Parameters
+    -------
+    path: str
+        File written, as printed by sacct --parsable2 --delimiter=';'.
+    n_jobs: int
+        Number of job allocations.
+    chunksize: int, optional
+        Jobs generated at a time. Defaults to 1000000.
+    **kwargs:
+        Passed on to synthetic_sacct_records.
+    """
+
+    options = {name: parameter.default for name, parameter in
+               inspect.signature(synthetic_sacct_records).parameters.items()
+               if parameter.default is not parameter.empty}
+    options.update(kwargs, chunksize=chunksize)
+    with open(path, 'w', encoding='UTF-8') as f:
+        f.write(';'.join(sacct_fields) + '\n')
+        for chunk in _chunks(n_jobs, **options):
+            chunk.to_csv(f, sep=';', header=False, index=False)
+
+
+def _chunks(n_jobs, d_from, d_to, seed, users, accounts, gpu_fraction,
+            array_fraction, pending_fraction, running_fraction, cluster,
+            chunksize):
+    """Split the window into consecutive chunks with their own seeds."""
+
+    start = pd.Timestamp(d_from).value
+    end = pd.Timestamp(d_to).value
+    n_chunks = max(-(-n_jobs // chunksize), 1) if n_jobs > 0 else 0
+    counts = np.diff(np.linspace(0, n_jobs, n_chunks + 1).astype(np.int64))
+    bounds = np.linspace(start, end, n_chunks + 1).astype(np.int64)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    # Ranks of users by activity are shared by every chunk
+    activity = 1 / np.arange(1, users + 1) ** 1.1
+    first_jobid = 1000000
+    for i, count in enumerate(counts):
+        yield _chunk(np.random.default_rng(seeds[i]), count,
+                     bounds[i], bounds[i + 1], end, first_jobid,
+                     activity / activity.sum(), accounts, gpu_fraction,
+                     array_fraction, pending_fraction, running_fraction,
+                     cluster)
+        first_jobid += count
+
+
+def _chunk(rng, n, start, end, now, first_jobid, activity, accounts,
+           gpu_fraction, array_fraction, pending_fraction, running_fraction,
+           cluster):
+    """Raw records of n jobs submitted between start and end."""
+
+    # Submissions are single jobs or arrays of consecutive tasks
+    n_array = int(round(n * array_fraction))
+    sizes = []
+    while sum(sizes) < n_array:
+        sizes.append(int(rng.geometric(0.1)) + 1)
+    sizes = np.array(sizes, dtype=np.int64)
+    if len(sizes):
+        sizes[-1] -= sizes.sum() - n_array
+        sizes = sizes[sizes > 0]
+    sizes = np.r_[np.ones(n - sizes.sum(), dtype=np.int64), sizes]
+    sizes = rng.permutation(sizes)
+    m = len(sizes)
+    task_of = np.repeat(np.arange(m), sizes)
+    task = np.arange(n) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    # Per submission attributes, shared by the tasks of an array
+    user = rng.choice(len(activity), size=m, p=activity)
+    account = user % accounts
+    gpus = np.where(rng.random(m) < gpu_fraction, rng.choice([1, 2, 4], size=m), 0)
+    cpus = np.where(gpus > 0, gpus * rng.choice([1, 6, 8], size=m),
+                    rng.choice(_cpu_choices, size=m,
+                               p=np.divide(_cpu_weights, sum(_cpu_weights))))
+    nodes = -(-cpus // _cores_per_node)
+    mem = cpus * rng.choice(_mem_choices, size=m,
+                            p=np.divide(_mem_weights, sum(_mem_weights)))
+    limit = rng.choice(_limit_choices, size=m,
+                       p=np.divide(_limit_weights, sum(_limit_weights)))
+    billing = np.where(gpus > 0, gpus * 16, np.maximum(cpus, -(-mem // 4000)))
+    submit = np.sort(rng.integers(start, max(end, start + 1), size=m)) // 10 ** 9
+
+    user, account, gpus, cpus, nodes, mem, limit, billing, submit = (
+        values[task_of] for values in
+        (user, account, gpus, cpus, nodes, mem, limit, billing, submit))
+
+    # Per job times, in seconds
+    second = 10 ** 9
+    now = now // second
+    delay = np.where(rng.random(n) < 0.05, rng.integers(60, 86400, size=n), 0)
+    eligible = submit + delay
+    wait = np.minimum(rng.lognormal(np.log(600), 1.5, size=n), 14 * 86400).astype(np.int64)
+    start_time = eligible + wait
+    limit_s = limit * 60
+    run = (rng.beta(2, 3, size=n) * limit_s).astype(np.int64) + 1
+
+    outcome = rng.random(n)
+    state = np.full(n, 'COMPLETED', dtype=object)
+    state[outcome < 0.15] = 'FAILED'
+    run = np.where(outcome < 0.15, np.minimum(run, 600), run)
+    timeout = (outcome >= 0.15) & (outcome < 0.22)
+    state[timeout] = 'TIMEOUT'
+    run = np.where(timeout, limit_s + rng.integers(0, 90, size=n), run)
+    cancelled = (outcome >= 0.22) & (outcome < 0.25)
+    state[cancelled] = 'CANCELLED by ' + (3000000 + user[cancelled]).astype(str).astype(object)
+
+    # Pending and running jobs are current as of now
+    kind = rng.random(n)
+    pending = kind < pending_fraction
+    running = ~pending & (kind < pending_fraction + running_fraction)
+    submit = np.where(pending, now - rng.integers(0, 2 * 86400, size=n), submit)
+    eligible = np.where(pending, submit, eligible)
+    start_time = np.where(running, now - (rng.random(n) * limit_s).astype(np.int64),
+                          start_time)
+    submit = np.where(running, np.minimum(submit, start_time - wait), submit)
+    eligible = np.where(running, np.minimum(eligible, start_time), eligible)
+    state[pending] = 'PENDING'
+    state[running] = 'RUNNING'
+    started = ~pending
+    finished = started & ~running
+    elapsed = np.where(running, now - start_time, np.where(pending, 0, run))
+    end_time = start_time + elapsed
+
+    alloc_cpus = np.where(started, cpus, 0)
+    alloc_nodes = np.where(started, nodes, 0)
+    jobid_raw = first_jobid + np.arange(n)
+    array_parent = jobid_raw - task
+    is_array = sizes[task_of] > 1
+    jobid = np.where(is_array,
+                     _str(array_parent) + '_' + _str(task),
+                     _str(jobid_raw))
+
+    gpu_tres = np.where(gpus > 0, ',gres/gpu=' + _str(gpus), '')
+    req_tres = ('billing=' + _str(billing) + ',cpu=' + _str(cpus) + gpu_tres
+                + ',mem=' + _str(mem) + 'M,node=' + _str(nodes))
+    tier = 'b' + _str(np.searchsorted(_tiers, limit) + 1)
+    partition = np.where(gpus > 0, 'gpubase_bygpu_',
+                         np.where(cpus >= _cores_per_node, 'cpubase_bynode_',
+                                  'cpubase_bycore_')) + tier
+    first_node = rng.integers(1, 1000, size=n)
+    node_list = np.where(nodes > 1,
+                         'node[' + _zfill(first_node, 4) + '-'
+                         + _zfill(first_node + nodes - 1, 4) + ']',
+                         'node' + _zfill(first_node, 4))
+    exit_code = np.where(state == 'FAILED', '1:0',
+                         np.where(state == 'TIMEOUT', '0:15', '0:0'))
+    total_cpu = (elapsed * cpus * rng.uniform(0.3, 1, size=n)).astype(np.int64)
+    group = 'def-pi' + _zfill(account, 3)
+    unknown = np.full(n, 'Unknown', dtype=object)
+    empty = np.full(n, '', dtype=object)
+
+    columns = {
+        'Account': group + np.where(gpus > 0, '_gpu', '_cpu'),
+        'AllocCPUS': _str(alloc_cpus),
+        'AllocNodes': _str(alloc_nodes),
+        'AllocTRES': np.where(started, req_tres, empty),
+        'AssocID': _str(user * 10 + (gpus > 0)),
+        'Cluster': np.full(n, cluster, dtype=object),
+        'CPUTimeRAW': _str(elapsed * alloc_cpus),
+        'CPUTime': _durations(elapsed * alloc_cpus),
+        'DerivedExitCode': np.full(n, '0:0', dtype=object),
+        'ElapsedRaw': _str(elapsed),
+        'Elapsed': _durations(elapsed),
+        'Eligible': np.where(pending & (delay > 0), unknown, _times(eligible)),
+        'End': np.where(finished, _times(end_time), unknown),
+        'ExitCode': exit_code,
+        'Flags': np.where(started, np.where(rng.random(n) < 0.6, 'SchedBackfill', 'SchedMain'),
+                          'SchedSubmit'),
+        'GID': _str(6000000 + account),
+        'Group': group,
+        'JobID': jobid,
+        'JobIDRaw': _str(jobid_raw),
+        'NCPUS': _str(cpus),
+        'NNodes': _str(nodes),
+        'NodeList': np.where(started, node_list, 'None assigned'),
+        'Priority': _str(rng.integers(1000, 500000, size=n)),
+        'Partition': partition,
+        'QOS': np.full(n, 'normal', dtype=object),
+        'QOSRAW': np.full(n, '1', dtype=object),
+        'Reason': np.where(pending, np.where(delay > 0, 'Dependency',
+                                             np.where(rng.random(n) < 0.5, 'Priority',
+                                                      'Resources')),
+                           'None'),
+        'ReqCPUS': _str(cpus),
+        'ReqMem': _str(mem // nodes) + 'M',
+        'ReqNodes': _str(nodes),
+        'ReqTRES': req_tres,
+        'Reserved': _durations(np.where(started, start_time - eligible, 0)),
+        'ResvCPURAW': _str(np.where(started, (start_time - eligible) * cpus, 0)),
+        'ResvCPU': _durations(np.where(started, (start_time - eligible) * cpus, 0)),
+        'Start': np.where(started, _times(start_time), unknown),
+        'State': state,
+        'Submit': _times(submit),
+        'Suspended': np.full(n, '00:00:00', dtype=object),
+        'SystemCPU': _durations(total_cpu // 20),
+        'TimelimitRaw': _str(limit),
+        'Timelimit': _durations(limit_s),
+        'TotalCPU': _durations(total_cpu),
+        'UID': _str(3000000 + user),
+        'User': 'user' + _zfill(user, 4),
+        'UserCPU': _durations(total_cpu - total_cpu // 20),
+        'WorkDir': '/home/user' + _zfill(user, 4) + '/scratch',
+    }
+    return pd.DataFrame({field: pd.Series(columns[field], dtype=object)
+                         for field in sacct_fields})
+
+
+def _str(values):
+    strings = np.empty(len(values), dtype=object)
+    strings[:] = list(map(str, np.asarray(values).tolist()))
+    return strings
+
+
+def _zfill(values, width):
+    """Zero padded strings of small non negative integers."""
+
+    values = np.asarray(values, dtype=np.int64)
+    if len(values) == 0:
+        return values.astype(object)
+    # Formatting every distinct value once is much faster than per element
+    table = np.array([str(i).zfill(width) for i in range(values.max() + 1)],
+                     dtype=object)
+    return table[values]
+
+
+def _times(seconds):
+    """Timestamps in sacct's '%Y-%m-%dT%H:%M:%S' layout."""
+
+    stamps = np.asarray(seconds, dtype=np.int64).astype('M8[s]')
+    return np.datetime_as_string(stamps, unit='s').astype(object)
+
+
+def _durations(seconds):
+    """Durations as sacct prints them, [D-]HH:MM:SS."""
+
+    seconds = np.asarray(seconds, dtype=np.int64)
+    days, rest = np.divmod(seconds, 86400)
+    clock = (_zfill(rest // 3600, 2) + ':' + _zfill(rest // 60 % 60, 2)
+             + ':' + _zfill(rest % 60, 2))
+    return np.where(days > 0, _str(days) + '-' + clock, clock)
@@ -0,0 +1,239 @@
+import numpy as np
+import pandas as pd
+
+
+def sweep_means(times, deltas, codes, n_codes, edges, pad, parts=None):
+    """Time weighted mean of step functions over fixed bins.
+
+    Every code describes an independent step function that starts at zero
+    and changes by the given delta at each event time. A function is only
+    defined from its first event up to its last event plus pad, which is the
+    range a per-second grouper would have materialized.
+
+    With parts, the events of a function come from two grouped series and
+    the function is only defined over the union of their ranges, as the
+    index of their difference. Bins entirely in the gap between the two
+    ranges take the mean of the previous bin, as forward filling the
+    resampled difference does.
+
+    Parameters
+    -------
+    times: ndarray of int64
+        Event times in nanoseconds since the epoch. NaT events must be
+        removed beforehand.
+    deltas: ndarray of float64
+        Change in level at each event. Either 1-D, or 2-D with one column
+        per weight.
+    codes: ndarray of int
+        Step function each event belongs to, in range(n_codes).
+    n_codes: int
+        Number of step functions.
+    edges: ndarray of int64
+        Sorted bin edges in nanoseconds since the epoch.
+    pad: int
+        Nanoseconds the level after the last event of a function is held.
+    parts: ndarray of int8, optional
+        Grouped series, 0 or 1, each event belongs to. Defaults to a single
+        series.
+
+    Returns
+    -------
+    means: ndarray of float64
+        Shape (n_codes, len(edges) - 1), with a trailing weight axis if
+        deltas is 2-D. Bins that do not overlap the defined range of a
+        function are NaN.
+    """
+
+    squeeze = deltas.ndim == 1
+    deltas = deltas[:, None] if squeeze else deltas
+    n_bins = len(edges) - 1
+    means = np.full((n_codes, max(n_bins, 0), deltas.shape[1]), np.nan)
+    if len(times) == 0 or n_bins < 1:
+        return means[..., 0] if squeeze else means
+
+    order = np.lexsort((times, codes))
+    times = times[order]
+    codes = codes[order]
+    deltas = deltas[order]
+    if parts is not None:
+        parts = parts[order]
+
+    # Contiguous runs of events that belong to the same function
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    counts = np.diff(np.r_[starts, len(codes)])
+    present = codes[starts]
+
+    # Level after each event, restarted at zero for every function
+    level = np.cumsum(deltas, axis=0)
+    level -= np.repeat(level[starts] - deltas[starts], counts, axis=0)
+
+    # Integral of the level from the first event of its function
+    t0 = times[0]
+    secs = (times - t0) / 1e9
+    area = level[:-1] * np.diff(secs)[:, None]
+    area[starts[1:] - 1] = 0
+    integral = np.vstack([np.zeros((1, deltas.shape[1])),
+                          np.cumsum(area, axis=0)])
+    integral -= np.repeat(integral[starts], counts, axis=0)
+
+    # Clip bin edges to the defined range of every function, and to the
+    # gap between the ranges of its two parts
+    lo = times[starts]
+    hi = times[starts + counts - 1] + pad
+    gap_lo, gap_hi = _part_gaps(times, codes, parts, present, pad)
+    query = np.hstack([np.clip(edges[None, :], lo[:, None], hi[:, None]),
+                       np.clip(edges[None, :], gap_lo[:, None], gap_hi[:, None])])
+    query_codes = np.repeat(present, 2 * len(edges))
+
+    # Last event at or before every query. Queries sort after events
+    # that share their time so that simultaneous events are included.
+    n_events = len(times)
+    merged_t = np.concatenate([times, query.ravel()])
+    merged_c = np.concatenate([codes, query_codes])
+    kind = np.r_[np.zeros(n_events, dtype=np.int8),
+                 np.ones(query.size, dtype=np.int8)]
+    merged = np.lexsort((kind, merged_t, merged_c))
+    is_query = kind[merged] == 1
+    rank = np.cumsum(~is_query) - 1
+    last = np.empty(query.size, dtype=np.int64)
+    last[merged[is_query] - n_events] = rank[is_query]
+
+    query_secs = (query.ravel() - t0) / 1e9
+    at_query = (integral[last]
+                + level[last] * (query_secs - secs[last])[:, None])
+    at_query = at_query.reshape(len(present), 2, len(edges), -1)
+    query_secs = query_secs.reshape(len(present), 2, len(edges))
+    area = np.diff(at_query[:, 0], axis=1) - np.diff(at_query[:, 1], axis=1)
+    covered = (np.diff(query_secs[:, 0], axis=1)
+               - np.diff(query_secs[:, 1], axis=1))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        found = np.where(covered[..., None] > 0, area / covered[..., None], np.nan)
+
+    # Forward fill the bins inside a gap
+    in_gap = ((covered <= 0) & (edges[None, :-1] >= lo[:, None])
+              & (edges[None, 1:] <= hi[:, None]))
+    if in_gap.any():
+        filled = np.where(in_gap, 0, np.arange(n_bins)[None, :])
+        filled = np.maximum.accumulate(filled, axis=1)
+        found = found[np.arange(len(present))[:, None], filled]
+    means[present] = found
+
+    return means[..., 0] if squeeze else means
+
+
+def _part_gaps(times, codes, parts, present, pad):
+    """Gap between the ranges of the two parts of every function.
+
+    Empty, at the start of the function, where the ranges overlap or a
+    part has no events. times and codes are sorted by code, then time.
+    """
+
+    gap_lo = np.full(len(present), times[0])
+    gap_hi = gap_lo.copy()
+    if parts is None:
+        return gap_lo, gap_hi
+
+    bounds = []
+    for part in (0, 1):
+        sel = np.flatnonzero(parts == part)
+        part_codes = codes[sel]
+        first = np.flatnonzero(np.r_[True, part_codes[1:] != part_codes[:-1]])
+        last = np.r_[first[1:], len(sel)] - 1
+        where = np.searchsorted(present, part_codes[first])
+        found = np.zeros(len(present), dtype=bool)
+        found[where] = True
+        low = np.zeros(len(present), dtype=np.int64)
+        high = np.zeros(len(present), dtype=np.int64)
+        low[where] = times[sel[first]]
+        high[where] = times[sel[last]] + pad
+        bounds.append((found, low, high))
+
+    (found_a, low_a, high_a), (found_b, low_b, high_b) = bounds
+    both = found_a & found_b
+    after = both & (high_a < low_b)
+    before = both & (high_b < low_a)
+    gap_lo = np.where(after, high_a, np.where(before, high_b, gap_lo))
+    gap_hi = np.where(after, low_b, np.where(before, low_a, gap_hi))
+    return gap_lo, gap_hi
+
+
+def sweep_use(jobs, weights, grouper_interval='S', usage_interval='H',
+              group_codes=None, n_groups=1):
+    """Queued and running usage of job records via an event sweep.
+
+    Equivalent to grouping submit, start and end times by grouper_interval,
+    taking the cumulative sum, resampling the result by usage_interval and
+    forward filling it, without materializing the intermediate series. As
+    there, usage is undefined between disjoint submit and start ranges, or
+    start and end ranges, e.g. for queued jobs that end after d_to.
+
+    Parameters
+    -------
+    jobs: DataFrame
+        Job records with submit, start and end datetime columns.
+    weights: array_like
+        Usage of every job. Either 1-D, or 2-D with one column per unit.
+    grouper_interval: str, optional
+        Resolution events are floored to. Defaults to 'S'.
+    usage_interval: str, optional
+        Fixed frequency of the output bins. Defaults to 'H'.
+    group_codes: array_like of int, optional
+        Group of every job, in range(n_groups). Defaults to a single group.
+    n_groups: int, optional
+        Number of groups in group_codes. Defaults to 1.
+
+    Returns
+    -------
+    bins: DatetimeIndex
+        Left edges of the output bins.
+    queued, running: ndarray
+        Shape (n_groups, len(bins)), with a trailing unit axis if weights
+        is 2-D. Bins outside the range of a group's events are NaN.
+    """
+
+    weights = np.nan_to_num(np.asarray(weights, dtype='float64'))
+    if group_codes is None:
+        group_codes = np.zeros(len(jobs), dtype=np.int64)
+    group_codes = np.asarray(group_codes, dtype=np.int64)
+
+    def floored(column):
+        stamps = pd.DatetimeIndex(jobs[column]).floor(grouper_interval)
+        return stamps.asi8, ~stamps.isna()
+
+    submit, has_submit = floored('submit')
+    start, has_start = floored('start')
+    end, has_end = floored('end')
+
+    # Queued functions use even codes and running functions odd codes
+    queued_codes = 2 * group_codes
+    running_codes = queued_codes + 1
+    times = np.concatenate([submit[has_submit], start[has_start],
+                            start[has_start], end[has_end]])
+    deltas = np.concatenate([weights[has_submit], -weights[has_start],
+                             weights[has_start], -weights[has_end]])
+    codes = np.concatenate([queued_codes[has_submit],
+                            queued_codes[has_start],
+                            running_codes[has_start],
+                            running_codes[has_end]])
+    # Submit and start are grouped separately for queued usage, start and
+    # end for running usage
+    parts = np.concatenate([np.zeros(has_submit.sum(), dtype=np.int8),
+                            np.ones(has_start.sum(), dtype=np.int8),
+                            np.zeros(has_start.sum(), dtype=np.int8),
+                            np.ones(has_end.sum(), dtype=np.int8)])
+
+    if len(times) == 0:
+        bins = pd.DatetimeIndex([])
+    else:
+        first = pd.Timestamp(times.min()).floor(usage_interval)
+        last = pd.Timestamp(times.max()).floor(usage_interval)
+        bins = pd.date_range(first, last, freq=usage_interval)
+
+    step = pd.Timedelta(pd.tseries.frequencies.to_offset(usage_interval))
+    edges = np.r_[bins.asi8, bins.asi8[-1:] + step.value]
+    pad = pd.Timedelta(
+        pd.tseries.frequencies.to_offset(grouper_interval)).value
+
+    means = sweep_means(times, deltas, codes, 2 * n_groups, edges, pad, parts)
+    return bins, means[0::2], means[1::2]
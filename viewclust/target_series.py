@@ -1,3 +1,5 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
 import pandas as pd
 
 
@@ -15,6 +17,8 @@ def target_series(time_frames):
 
             time_frames = [(d_from,d_dec,100),(d_dec,d_to,500)]
 
+        Where periods overlap, the first period in the list wins.
+
     Returns
     -------
     tar_frame: Pandas Series
@@ -35,21 +39,155 @@ def target_series(time_frames):
     See Also
     -------
     jobUse: Generates the input frame for this function.
+    TargetSteps: Same target without materializing hourly points.
     """
 
-    series_list = []
-    for period in time_frames:
-        query_period = pd.date_range(start=period[0], end=period[1], freq='H')
-        new_series = pd.Series(index=query_period, dtype='float64')
-        new_series = new_series.fillna(pd.to_numeric(period[2]))
-        series_list.append(new_series)
+    return TargetSteps(time_frames).series()
+
+
+class TargetSteps:
+    """Lazy, piecewise constant target built from target_series time frames.
+
+    Overlapping periods are resolved once into disjoint runs of points, so
+    the target can be evaluated or accumulated at any times without
+    materializing every hourly point. As in target_series, a point is only
+    dropped when an earlier period already has a point at the same time, so
+    periods that are not aligned to freq keep their own points.
+
+    Parameters
+    -------
+    time_frames: list, tuples of 3
+        (start, end, value) periods, see target_series.
+    freq: pandas freq str, optional
+        Spacing of the points of every period. Defaults to 'H'.
+    """
+
+    def __init__(self, time_frames, freq='H'):
+        self.freq = freq
+        step = pd.Timedelta(pd.tseries.frequencies.to_offset(freq)).value
+        self._step = step
+
+        # Points of periods sharing an offset from the freq grid can
+        # collide, points of different offsets never do. Every offset keeps
+        # the intervals its earlier periods cover, and its own runs.
+        covered = {}
+        runs = {}
+        for period in time_frames:
+            start = pd.to_datetime(period[0]).value
+            end = pd.to_datetime(period[1]).value
+            value = float(pd.to_numeric(period[2]))
+            if end < start:
+                continue
+            last = (end - start) // step
+            end = start + last * step
+
+            covered_starts, covered_ends = covered.setdefault(start % step, ([], []))
+            firsts, counts, values = runs.setdefault(start % step, ([], [], []))
+
+            # Points of this period not covered by an earlier period
+            lo = bisect_left(covered_ends, start)
+            hi = bisect_right(covered_starts, end)
+            k = 0
+            for c_start, c_end in zip(covered_starts[lo:hi], covered_ends[lo:hi]):
+                k_stop = (c_start - start) // step
+                if k_stop > k:
+                    firsts.append(start + k * step)
+                    counts.append(k_stop - k)
+                    values.append(value)
+                k = max(k, (c_end - start) // step + 1)
+            if k <= last:
+                firsts.append(start + k * step)
+                counts.append(last + 1 - k)
+                values.append(value)
+
+            # Merge the period into the covered intervals
+            if lo < hi:
+                start = min(start, covered_starts[lo])
+                end = max(end, covered_ends[hi - 1])
+            covered_starts[lo:hi] = [start]
+            covered_ends[lo:hi] = [end]
+
+        self._runs = []
+        for firsts, counts, values in runs.values():
+            order = np.argsort(np.array(firsts, dtype=np.int64), kind='stable')
+            firsts = np.array(firsts, dtype=np.int64)[order]
+            counts = np.array(counts, dtype=np.int64)[order]
+            values = np.array(values, dtype='float64')[order]
+            totals = np.r_[0, np.cumsum(values * counts)]
+            self._runs.append((firsts, counts, values, totals))
+
+    def series(self):
+        """Materialize every point, as target_series does."""
+        times, values = [], []
+        for firsts, counts, run_values, _ in self._runs:
+            offsets = np.arange(counts.sum()) - np.repeat(
+                np.cumsum(counts) - counts, counts)
+            times.append(np.repeat(firsts, counts) + offsets * self._step)
+            values.append(np.repeat(run_values, counts))
+        times = np.concatenate(times) if times else np.array([], dtype=np.int64)
+        values = np.concatenate(values) if values else np.array([])
+        order = np.argsort(times, kind='stable')
+        return pd.Series(values[order], index=pd.DatetimeIndex(times[order]),
+                         dtype='float64')
+
+    def _locate(self, times):
+        """Run of every offset holding each time of an index, -1 before the
+        first run."""
+        times = times.asi8
+        for firsts, counts, values, totals in self._runs:
+            run = np.searchsorted(firsts, times, side='right') - 1
+            clipped = np.clip(run, 0, len(firsts) - 1)
+            yield times, run, clipped, firsts, counts, values, totals
+
+    def __call__(self, times):
+        """Value of the target at the given times, NaN where undefined.
+
+        Every point holds its value until the next point of its run. Where
+        runs of different offsets overlap, the latest point wins.
+        """
+        index = _as_index(times)
+        result = np.full(len(index), np.nan)
+        latest = np.full(len(index), np.iinfo(np.int64).min)
+        for times, run, clipped, firsts, counts, values, _ in self._locate(index):
+            point = firsts[clipped] + np.minimum(
+                (times - firsts[clipped]) // self._step,
+                counts[clipped] - 1) * self._step
+            inside = (run >= 0) & (
+                times < firsts[clipped] + counts[clipped] * self._step)
+            newer = inside & (point >= latest)
+            result = np.where(newer, values[clipped], result)
+            latest = np.where(newer, point, latest)
+        return pd.Series(result, index=index)
+
+    def cumulative(self, times):
+        """Sum of every point at or before the given times.
+
+        Equal to np.cumsum(target_series(time_frames)) sampled at times.
+        """
+        index = _as_index(times)
+        result = np.zeros(len(index))
+        for times, run, clipped, firsts, counts, values, totals in self._locate(index):
+            count = (times - firsts[clipped]) // self._step + 1
+            count = np.clip(count, 0, counts[clipped])
+            result += np.where(run >= 0, totals[clipped] + values[clipped] * count, 0.0)
+        return pd.Series(result, index=index)
+
+    def integrate(self, times):
+        """Integral of the target up to the given times, in value x freq.
 
-    tar_frame = pd.Series( dtype='object' )
-    for period in series_list:
-        tar_frame = pd.concat([tar_frame,period])
-        #tar_frame = tar_frame.append(period)
+        Every point contributes its value over one freq from its time.
+        """
+        index = _as_index(times)
+        result = np.zeros(len(index))
+        for times, run, clipped, firsts, counts, values, totals in self._locate(index):
+            steps = (times - firsts[clipped]) / self._step
+            steps = np.clip(steps, 0, counts[clipped])
+            result += np.where(run >= 0, totals[clipped] + values[clipped] * steps, 0.0)
+        return pd.Series(result, index=index)
 
-    # Avoid overlapping by keeping first
-    tar_frame = tar_frame.groupby(tar_frame.index).first()
 
-    return tar_frame
+def _as_index(times):
+    # to_datetime iterates over an index it is given
+    if isinstance(times, pd.DatetimeIndex):
+        return times
+    return pd.DatetimeIndex(pd.to_datetime(times))
@@ -1,7 +1,51 @@
-from typing import Union, Optional, List
+from typing import Callable, Union, Optional, List
+import shutil
+import sys
+import time
+import numpy as np
 import pandas as pd
 import plotille
-import os
+
+# Characters taken by the y axis ticks and the plot borders
+_axis_columns = 20
+# Lines taken by the title, the x axis and the legend
+_axis_lines = 8
+
+
+def bin_series(series: pd.Series, columns: int) -> pd.DataFrame:
+    """
+    Reduce a datetime series to one min, max and mean per terminal column
+
+    Parameters
+    -------
+    series:
+        A datetime series
+    columns:
+        Number of equal time bins spanning the series
+
+    Returns
+    -------
+    DataFrame
+        min, max and mean columns indexed by the middle of every non empty
+        bin. Series shorter than columns are returned with the three
+        columns equal.
+    """
+
+    series = series.dropna()
+    values = series.to_numpy(dtype='float64')
+    if len(series) <= columns:
+        return pd.DataFrame({'min': values, 'max': values, 'mean': values},
+                            index=series.index)
+
+    stamps = series.index.asi8
+    edges = np.linspace(stamps[0], stamps[-1], columns + 1)
+    codes = np.clip(np.searchsorted(edges, stamps, side='right') - 1,
+                    0, columns - 1)
+    binned = pd.Series(values).groupby(codes).agg(['min', 'max', 'mean'])
+    middles = (edges[:-1] + edges[1:]) / 2
+    # Plotted through datetime, which stops at microseconds
+    binned.index = pd.to_datetime(middles[binned.index].astype('int64')).floor('us')
+    return binned
 
 
 def to_terminal(series: Union[pd.Series, List[pd.Series]],
@@ -10,6 +54,9 @@ def to_terminal(series: Union[pd.Series, List[pd.Series]],
     """
     Plot a datetime series (or a list of them) to terminal
 
+    Every series is binned to the width of the terminal first, drawing the
+    mean of every column as a line and its min and max as points.
+
     Parameters
     -------
     series:
@@ -22,7 +69,71 @@ def to_terminal(series: Union[pd.Series, List[pd.Series]],
         If multiple series, the labels of each ome
     """
 
-    size = os.get_terminal_size()
+    print(_render(series, title, pu, labels))
+
+
+def watch_terminal(source: Callable[[], Union[pd.Series, List[pd.Series]]],
+                   interval: float = 60,
+                   title: str = 'resource usage',
+                   pu: str = 'cpu', labels: Optional[list] = None,
+                   frames: Optional[int] = None):
+    """
+    Redraw the plot of an updating usage series at a fixed interval
+
+    Stops after frames redraws, or on Ctrl-C.
+
+    Parameters
+    -------
+    source:
+        Called before every redraw for the series to plot, e.g. a function
+        feeding the records that changed since the last redraw to a
+        UsageTracker and returning its usage, so the history is neither
+        queried nor recomputed for every frame.
+    interval:
+        Seconds between the start of two redraws
+    title:
+        Title for the plot
+    pu:
+        Processing using (GPU or CPU) for y axis
+    labels:
+        If multiple series, the labels of each ome
+    frames:
+        Number of redraws. If None, redraws until interrupted
+
+    Examples
+    -------
+    tracker = UsageTracker(window='2D')
+    tracker.update(sacct_jobs(account, d_from))
+
+    def refresh():
+        # Only jobs active since shortly before the previous redraw. sacct
+        # runs in UTC. A quiet poll is empty and only moves the window.
+        now = pd.Timestamp.utcnow().tz_localize(None)
+        since = now - pd.Timedelta('10min')
+        tracker.update(sacct_jobs(account, f'{since:%Y-%m-%dT%H:%M:%S}'),
+                       now=now)
+        return list(tracker.usage())
+
+    watch_terminal(refresh, interval=300, labels=['queued', 'running'])
+    """
+
+    drawn = 0
+    try:
+        while frames is None or drawn < frames:
+            started = time.monotonic()
+            frame = _render(source(), title, pu, labels)
+            # Clear the screen and move to the top left corner
+            sys.stdout.write('\x1b[H\x1b[2J' + frame + '\n')
+            sys.stdout.flush()
+            drawn += 1
+            if frames is None or drawn < frames:
+                time.sleep(max(0., interval - (time.monotonic() - started)))
+    except KeyboardInterrupt:
+        pass
+
+
+def _render(series, title, pu, labels):
+    size = shutil.get_terminal_size()
     colors = ['blue', 'yellow', 'magenta', 'cyan', 'white', 'green']
     if not isinstance(series, list):
         series = [series]
@@ -31,17 +142,33 @@ def to_terminal(series: Union[pd.Series, List[pd.Series]],
     else:
         if len(labels) != len(series):
             raise Exception('Labels do not match inputs')
-    print(title.center(size.columns))
+
     fig = plotille.Figure()
     fig.color_mode = 'names'
     fig.x_label = 'Dates'
     fig.y_label = f'{pu} count'
-    for idx, s in enumerate(series):
-        s = s.map('{:.2f}'.format).astype(float)
-        x = s.index
-        y = s.values
-        q1 = s.quantile(0.1)
-        fig.set_x_limits(min_=min(x), max_=max(x))
-        fig.set_y_limits(min_=min(y) - q1, max_=max(y) + q1)
-        fig.plot(x, y, lc=colors[idx], label=labels[idx])
-    print(fig.show(legend=True))
+    fig.width = max(size.columns - _axis_columns, 10)
+    fig.height = max(size.lines - _axis_lines, 5)
+
+    binned = [bin_series(s, fig.width) for s in series]
+    drawn = [b for b in binned if len(b) > 0]
+    if drawn:
+        # One set of limits fits every series
+        margin = max(b['mean'].quantile(0.1) for b in drawn)
+        fig.set_x_limits(min_=min(b.index[0] for b in drawn).to_pydatetime(),
+                         max_=max(b.index[-1] for b in drawn).to_pydatetime())
+        fig.set_y_limits(min_=min(b['min'].min() for b in drawn) - margin,
+                         max_=max(b['max'].max() for b in drawn) + margin)
+
+    for idx, b in enumerate(binned):
+        if len(b) == 0:
+            continue
+        x = list(b.index.to_pydatetime())
+        fig.plot(x, b['mean'].tolist(), lc=colors[idx], label=labels[idx])
+        spread = (b['max'] > b['min']).to_numpy()
+        if spread.any():
+            extremes = [t for t, s in zip(x, spread) if s]
+            fig.scatter(extremes * 2, b['min'][spread].tolist()
+                        + b['max'][spread].tolist(), lc=colors[idx],
+                        label=f'{labels[idx]} min/max' if labels[idx] else None)
+    return title.center(size.columns) + '\n' + fig.show(legend=True)
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+# Separates the TRES string column from the TRES name in pre-parsed
+# columns, e.g. reqtres_gres/gpu
+tres_separator = '_'
+
+# Size suffixes of TRES values relative to megabytes
+_size_scale = {'K': 1 / 1024, 'M': 1, 'G': 1024, 'T': 1024 ** 2, 'P': 1024 ** 3}
+
+
+def parse_tres(tres):
+    """Parse TRES strings into a numeric frame with one column per TRES.
+
+    Parameters
+    -------
+    tres: Series of str
+        TRES strings as printed by sacct, e.g.
+        'billing=4,cpu=4,gres/gpu:v100=2,gres/gpu=2,mem=16G,node=1'.
+
+    Returns
+    -------
+    DataFrame
+        Aligned with tres, columns named after the lower cased TRES, e.g.
+        'cpu', 'mem', 'node', 'billing', 'gres/gpu', 'gres/gpu:v100'.
+        Sized values like mem are in MB. Missing TRES are 0.
+    """
+
+    tres = pd.Series(tres)
+    positions = pd.Series(tres.to_numpy(dtype=object), dtype=object)
+    pairs = positions.fillna('').str.split(',').explode()
+    pairs = pairs[pairs.str.contains('=', regex=False, na=False)]
+    if pairs.empty:
+        return pd.DataFrame(index=tres.index, dtype='float64')
+
+    key_value = pairs.str.split('=', n=1, expand=True)
+    keys = key_value[0].str.strip().str.lower()
+    keys = keys.where(keys != 'gpu', 'gres/gpu')
+    values = key_value[1].str.strip()
+
+    suffix = values.str[-1:].str.upper()
+    scale = suffix.map(_size_scale)
+    numbers = pd.to_numeric(values.where(scale.isna(), values.str[:-1]), errors='coerce')
+    numbers = numbers * scale.fillna(1)
+
+    parsed = pd.DataFrame({'key': keys.to_numpy(), 'value': numbers.to_numpy()},
+                          index=pairs.index)
+    parsed = parsed.groupby([parsed.index, 'key'])['value'].sum().unstack(fill_value=0)
+    parsed = parsed.reindex(np.arange(len(tres)), fill_value=0).fillna(0)
+    parsed.index = tres.index
+    parsed.columns.name = None
+    return parsed.astype('float64')
+
+
+def tres_matrix(jobs):
+    """Requested resources of every job as a numeric frame.
+
+    Columns are 'cpu' (from reqcpus), 'mem' in MB (from mem) and every TRES
+    found in reqtres other than those, e.g. 'billing', 'node', 'gres/gpu'
+    and typed GPUs like 'gres/gpu:v100'. The reqtres_* columns added by
+    sacct_jobs are used when present, otherwise reqtres is parsed.
+    """
+
+    prefix = 'reqtres' + tres_separator
+    parsed = [c for c in jobs.columns if c.startswith(prefix)]
+    if parsed:
+        tres = jobs[parsed].rename(columns=lambda c: c[len(prefix):])
+        tres = tres.astype('float64').fillna(0)
+    else:
+        tres = parse_tres(jobs['reqtres'])
+    tres = tres.drop(columns=[c for c in ['cpu', 'mem'] if c in tres.columns])
+    matrix = pd.DataFrame({'cpu': jobs['reqcpus'], 'mem': jobs['mem']},
+                          index=jobs.index).astype('float64').fillna(0)
+    return pd.concat([matrix, tres], axis=1)
@@ -0,0 +1,210 @@
+import heapq
+import numpy as np
+import pandas as pd
+from viewclust.job_use import _unit_weights
+
+_nat = np.iinfo(np.int64).min
+
+
+class UsageTracker:
+    """Incrementally updated queued and running usage over a sliding window.
+
+    Follows the job_use semantics for job_state='all': a job is queued
+    from submit to start and running from start to end, event times are
+    floored to grouper_interval and usage is the time weighted mean over
+    usage_interval bins. Every bin keeps the sum of the level changes in it
+    and their time weighted sum, so inserting or retracting an event only
+    touches its own bin. Bins older than the window are folded into a base
+    level.
+
+    Unlike job_use, every bin is averaged over its full width, and the
+    last bin up to now, and levels hold until now instead of ending at the
+    last event of the records.
+
+    Parameters
+    -------
+    window: Timedelta str, optional
+        Length of the tracked period ending at now. Defaults to '7D'.
+    use_unit: str, optional
+        Usage unit, see job_use. Defaults to 'cpu'.
+    grouper_interval: str, optional
+        Resolution events are floored to. Defaults to 'S'.
+    usage_interval: str, optional
+        Fixed frequency of the bins. Defaults to 'H'.
+
+    Examples
+    -------
+    tracker = UsageTracker(window='2D', use_unit='gpu')
+    tracker.update(sacct_jobs(account, d_from))
+    # Every few minutes, only records that changed since the last refresh
+    tracker.update(changed_jobs)
+    queued, running = tracker.usage()
+    """
+
+    def __init__(self, window='7D', use_unit='cpu', grouper_interval='S',
+                 usage_interval='H'):
+        self.window = pd.Timedelta(window)
+        self.use_unit = use_unit
+        self.grouper_interval = grouper_interval
+        self.usage_interval = usage_interval
+        self._step = pd.Timedelta(
+            pd.tseries.frequencies.to_offset(usage_interval)).value
+
+        self.now = None
+        self._origin = None
+        # Queued and running level before the first bin
+        self._base = np.zeros(2)
+        # Per bin sum of level changes, and of changes times their offset
+        # into the bin in seconds
+        self._s0 = np.zeros((2, 0))
+        self._s1 = np.zeros((2, 0))
+        # Events of every tracked job: jobid -> (weight, submit, start, end)
+        self._jobs = {}
+        self._ends = []
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def update(self, jobs, now=None):
+        """Insert new job records and replace changed ones.
+
+        Parameters
+        -------
+        jobs: DataFrame
+            Job records with a jobid column, e.g. from sacct_jobs. An empty
+            frame, as sacct_jobs returns without matching jobs, only
+            advances to the given now. A record
+            with a tracked jobid retracts the events of the previous record.
+            Records of jobs that ended before the window, e.g. reported
+            again by an overlapping sacct query, only retract and are not
+            tracked again.
+        now: date str, optional
+            Time the records are current to. Defaults to the latest of the
+            previous now and every event time in jobs.
+        """
+
+        if jobs.empty:
+            if now is not None:
+                self.advance(now)
+            return
+
+        jobs = jobs.drop_duplicates(subset='jobid', keep='last')
+        weights = _unit_weights(jobs, [self.use_unit])[self.use_unit]
+        weights = np.nan_to_num(weights.to_numpy(dtype='float64'))
+        times = np.vstack([
+            pd.DatetimeIndex(jobs[column]).floor(self.grouper_interval).asi8
+            for column in ('submit', 'start', 'end')])
+
+        if now is None:
+            latest = times[times != _nat]
+            now = latest.max() if latest.size else self.now
+            if now is None:
+                return
+        self.advance(now)
+
+        jobids = jobs['jobid'].tolist()
+        self.remove(jobids)
+
+        # Finished before the window, all their events cancel out in the
+        # base level
+        current = (times[2] == _nat) | (times[2] >= self._origin)
+        jobids = [jobid for jobid, keep in zip(jobids, current) if keep]
+        weights, times = weights[current], times[:, current]
+        self._apply(weights, times, 1)
+
+        for jobid, weight, submit, start, end in zip(jobids, weights, *times):
+            self._jobs[jobid] = (weight, submit, start, end)
+            if end != _nat:
+                heapq.heappush(self._ends, (end, jobid))
+
+    def remove(self, jobids):
+        """Retract every event of the given jobs."""
+
+        previous = [self._jobs.pop(jobid) for jobid in jobids
+                    if jobid in self._jobs]
+        if previous:
+            weights, *times = zip(*previous)
+            self._apply(np.array(weights, dtype='float64'),
+                        np.array(times, dtype=np.int64), -1)
+
+    def advance(self, now):
+        """Move now forward, evicting bins that leave the window."""
+
+        now = pd.Timestamp(now).value
+        if self.now is not None and now <= self.now:
+            return
+        self.now = now
+
+        origin = pd.Timestamp(now - self.window.value).floor(
+            self.usage_interval).value
+        if self._origin is None:
+            self._origin = origin
+        elif origin > self._origin:
+            evicted = min((origin - self._origin) // self._step,
+                          self._s0.shape[1])
+            self._base += self._s0[:, :evicted].sum(axis=1)
+            self._s0 = self._s0[:, evicted:]
+            self._s1 = self._s1[:, evicted:]
+            self._origin = origin
+
+            # Finished jobs before the window can no longer change
+            while self._ends and self._ends[0][0] < origin:
+                end, jobid = heapq.heappop(self._ends)
+                if jobid in self._jobs and self._jobs[jobid][3] == end:
+                    del self._jobs[jobid]
+
+        self._grow(-(-(now - self._origin) // self._step))
+
+    def usage(self):
+        """Queued and running usage of every bin in the window.
+
+        Returns
+        -------
+        queued, running: Series
+            Indexed by the left edge of the bins, up to the bin holding now.
+        """
+
+        n_bins = 0 if self.now is None else -(-(self.now - self._origin) // self._step)
+        starts = self._origin + np.arange(n_bins, dtype=np.int64) * self._step
+        index = pd.DatetimeIndex(starts)
+        if n_bins == 0:
+            empty = pd.Series([], index=index, dtype='float64', name='use_unit')
+            return empty, empty.copy()
+
+        s0 = self._s0[:, :n_bins]
+        s1 = self._s1[:, :n_bins]
+        level = self._base[:, None] + np.cumsum(s0, axis=1) - s0
+        width = np.minimum(self.now - starts, self._step) / 1e9
+        means = ((level + s0) * width - s1) / width
+        return (pd.Series(means[0], index=index, name='use_unit'),
+                pd.Series(means[1], index=index, name='use_unit'))
+
+    def _grow(self, n_bins):
+        missing = n_bins - self._s0.shape[1]
+        if missing > 0:
+            self._s0 = np.hstack([self._s0, np.zeros((2, missing))])
+            self._s1 = np.hstack([self._s1, np.zeros((2, missing))])
+
+    def _apply(self, weights, times, sign):
+        """Add the events of jobs, or retract them with sign -1."""
+
+        submit, start, end = times
+        times = np.concatenate([submit, start, start, end])
+        deltas = sign * np.concatenate([weights, -weights, weights, -weights])
+        codes = np.repeat([0, 0, 1, 1], len(weights))
+
+        valid = times != _nat
+        times, deltas, codes = times[valid], deltas[valid], codes[valid]
+        bins = (times - self._origin) // self._step
+
+        before = bins < 0
+        np.add.at(self._base, codes[before], deltas[before])
+
+        inside = ~before
+        times, deltas, codes, bins = (times[inside], deltas[inside],
+                                      codes[inside], bins[inside])
+        if len(bins):
+            self._grow(bins.max() + 1)
+        offsets = (times - self._origin - bins * self._step) / 1e9
+        np.add.at(self._s0, (codes, bins), deltas)
+        np.add.at(self._s1, (codes, bins), deltas * offsets)
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+import hashlib
+import inspect
+import os
+import pickle
+import pandas as pd
+from viewclust.billing import billing_profiles
+from viewclust.job_use import job_use
+from viewclust.serialize import serialize
+
+# Columns job_use may read. Only these take part in the fingerprint.
+fingerprint_columns = ['submit', 'start', 'end', 'eligible', 'state', 'timelimit',
+                       'reqcpus', 'mem', 'reqtres']
+
+# job_use arguments that only have side effects
+_serialize_args = ['serialize_queued', 'serialize_running', 'serialize_dist']
+
+_job_use_signature = inspect.signature(job_use)
+
+
+def frame_fingerprint(frame, columns=None):
+    """Cheap content hash of a frame or series.
+
+    Hashes the shape, column names, dtypes and the vectorized pandas hash of
+    the values, so any edit of a used column changes the fingerprint.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(frame, pd.DataFrame):
+        if columns is not None:
+            frame = frame[[c for c in columns if c in frame.columns]]
+        digest.update(repr((frame.shape, list(frame.columns),
+                            [str(t) for t in frame.dtypes])).encode())
+    else:
+        digest.update(repr((frame.shape, frame.name, str(frame.dtype))).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class UseCache:
+    """Opt-in memoization of job_use results.
+
+    Results are keyed on a fingerprint of the jobs frame plus every
+    parameter, defaults included, and evicted least recently used first once either maxsize
+    entries or max_bytes are exceeded. Optionally, results are also kept
+    as pickles in a directory with its own size limit.
+
+    Parameters
+    -------
+    maxsize: int, optional
+        Maximum number of results kept in memory. Defaults to 32.
+    max_bytes: int, optional
+        Maximum total size of results kept in memory. 0 for no limit.
+        Defaults to 0.
+    directory: str, optional
+        Directory for the on disk cache. If empty, results are only kept in
+        memory. Results are stored as pickles, and loading a pickle can run
+        arbitrary code, so only use a directory no one else can write to.
+        A new directory is created readable by its owner only.
+        Defaults to the empty string.
+    disk_max_bytes: int, optional
+        Maximum total size of the on disk cache. 0 for no limit.
+        Defaults to 0.
+
+    Examples
+    -------
+    cache = UseCache(maxsize=64)
+    clust, queued, running, dist = cache.job_use(jobs, d_from, 50, use_unit='gpu')
+    cache.hits, cache.misses
+    """
+
+    def __init__(self, maxsize=32, max_bytes=0, directory='', disk_max_bytes=0):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        if directory != '':
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def key(self, jobs, d_from, target, **kwargs):
+        """Cache key of a job_use call.
+
+        Arguments are bound to the job_use signature with their defaults,
+        so passing a default explicitly gives the same key as omitting it.
+        The weights of billing profiles used as use units are part of the
+        key, so re-registering a profile does not return stale results.
+        """
+        bound = _job_use_signature.bind(jobs, d_from, target, **kwargs)
+        bound.apply_defaults()
+        params = {k: v for k, v in bound.arguments.items()
+                  if k not in _serialize_args + ['jobs', 'd_from', 'target']}
+        if isinstance(target, (pd.Series, pd.DataFrame)):
+            target = frame_fingerprint(target)
+        use_units = params['use_unit']
+        use_units = [use_units] if isinstance(use_units, str) else list(use_units)
+        profiles = [(unit, billing_profiles[unit]['mode'],
+                     sorted(billing_profiles[unit]['weights'].items()))
+                    for unit in use_units if unit in billing_profiles]
+        params = repr((d_from, target, sorted(params.items()), profiles))
+        digest = hashlib.blake2b(params.encode(), digest_size=16)
+        columns = fingerprint_columns + [c for c in jobs.columns if str(c).startswith('reqtres_')]
+        digest.update(frame_fingerprint(jobs, columns).encode())
+        return digest.hexdigest()
+
+    def job_use(self, jobs, d_from, target, **kwargs):
+        """Cached job_use. Takes and returns the same as job_use."""
+
+        key = self.key(jobs, d_from, target, **kwargs)
+        result = self._get(key)
+        if result is None:
+            self.misses += 1
+            params = {k: v for k, v in kwargs.items() if k not in _serialize_args}
+            result = job_use(jobs, d_from, target, **params)
+            self._put(key, result)
+
+        for arg, obj in zip(_serialize_args, result[1:]):
+            if kwargs.get(arg, '') != '':
+                serialize(obj, kwargs[arg])
+
+        return tuple(obj.copy() for obj in result)
+
+    @property
+    def stats(self):
+        """Counters and current size of the cache."""
+        return {'hits': self.hits, 'misses': self.misses,
+                'disk_hits': self.disk_hits, 'entries': len(self._entries),
+                'bytes': self._bytes}
+
+    def clear(self):
+        """Drop every in memory entry. The on disk cache is kept."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+        path = self._path(key)
+        if path and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+            os.utime(path)
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, result)
+            return result
+
+        return None
+
+    def _put(self, key, result):
+        self._remember(key, result)
+        path = self._path(key)
+        if path:
+            with open(path, 'wb') as f:
+                pickle.dump(result, f, protocol=4)
+            self._evict_disk()
+
+    def _remember(self, key, result):
+        size = sum(int(pd.Series(obj.memory_usage(index=True, deep=True)).sum())
+                   for obj in result)
+        self._entries[key] = (result, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.maxsize
+                                 or (self.max_bytes and self._bytes > self.max_bytes)):
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl') if self.directory != '' else ''
+
+    def _evict_disk(self):
+        if not self.disk_max_bytes:
+            return
+        files = [os.path.join(self.directory, f) for f in os.listdir(self.directory)
+                 if f.endswith('.pkl')]
+        files.sort(key=os.path.getmtime)
+        total = sum(os.path.getsize(f) for f in files)
+        while files and total > self.disk_max_bytes:
+            oldest = files.pop(0)
+            total -= os.path.getsize(oldest)
+            os.remove(oldest)